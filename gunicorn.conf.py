@@ -1,7 +1,22 @@
 # gunicorn.conf.py
+import os
+
 # Non logging stuff
+# SERVER_MODE=asgi serves the async views through uvicorn workers. Streamed responses (exports and
+# diffs) cannot query the database there under Django 3.2, mdb/asgi.py serves them as WSGI in a thread
+server_mode = os.getenv("SERVER_MODE", "wsgi")
+if server_mode == "asgi":
+    wsgi_app = "mdb.asgi:application"
+    worker_class = "uvicorn.workers.UvicornWorker"
+else:
+    wsgi_app = "mdb.wsgi:application"
+    # Threaded workers keep answering the arbiter while a thread streams a long export
+    worker_class = "gthread"
+    threads = int(os.getenv("GUNICORN_THREADS", "4"))
 bind = "0.0.0.0:8000"
 workers = 3
+# Seconds before a silent worker is restarted, not a limit on the length of a response
+timeout = 120
 # Whether to send Django output to the error log 
 capture_output = True
 # How verbose the Gunicorn error logs should be 
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class InventoryConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'inventory'
+
+    def ready(self):
+        # Mirror the task progress into the progress cache, and stamp the changes
+        import inventory.progress  # noqa: F401
+        import inventory.stamps  # noqa: F401
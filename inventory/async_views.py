@@ -0,0 +1,133 @@
+import asyncio
+from functools import partial
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.http import JsonResponse
+from django.utils.cache import add_never_cache_headers
+from django.shortcuts import render
+from inventory import catalog
+from inventory.stamps import PRODUCTS, TASKS
+from inventory.utils import WorkflowProgress
+from inventory.views import (
+    executor, get_active_databases, get_error, get_page_size, get_products_listing, get_progress_update,
+    get_search_context, get_search_params, get_tasks, get_workflow, get_workflow_progress, query_database, stamped
+)
+
+
+def query_databases(func, *args):
+    try:
+        return func(*args)
+    finally:
+        connections.close_all()
+
+
+async def gather_databases(func, databases, *args, timeout=None):
+    """
+    Call `func(db_alias, *args)` for every database concurrently, each in a thread of `executor`.
+    Returns the result per database, or the exception raised (asyncio.TimeoutError when the
+    database did not answer within `timeout` seconds), so that the others are still shown.
+    """
+    timeout = timeout if timeout is not None else settings.ASYNC_DB_TIMEOUT
+    loop = asyncio.get_running_loop()
+
+    async def query(db_alias):
+        try:
+            return await asyncio.wait_for(
+                loop.run_in_executor(executor, partial(query_database, func, db_alias, *args, timeout=timeout)), timeout
+            )
+        except Exception as e:
+            return e
+
+    results = await asyncio.gather(*(query(db_alias) for db_alias in databases))
+    return dict(zip(databases, results))
+
+
+@stamped(PRODUCTS)
+async def list_all_products(request):
+    databases = get_active_databases()
+    all_products = {}
+    size = get_page_size(request)
+
+    results = await gather_databases(lambda db_alias: get_products_listing(request, db_alias, size), databases)
+    for db_alias, result in results.items():
+        if isinstance(result, Exception):
+            all_products[db_alias] = {'error': f"Error fetching products: {get_error(result)}"}
+        else:
+            all_products[db_alias] = result
+
+    return render(request, 'inventory/products/list.html', {'all_products': all_products})
+
+
+@stamped(PRODUCTS)
+async def search_all_products(request):
+    query, page, size, limit = get_search_params(request)
+    results = {}
+    if query:
+        results = await gather_databases(catalog.search, get_active_databases(), query, limit)
+
+    context = get_search_context(request, query, page, size, results)
+    return render(request, 'inventory/products/search.html', context)
+
+
+@stamped(TASKS)
+async def list_all_tasks(request):
+    databases = get_active_databases()
+    all_tasks = {}
+
+    results = await gather_databases(get_tasks, databases)
+    for db_alias, result in results.items():
+        if isinstance(result, Exception):
+            all_tasks[db_alias] = f"Error fetching tasks: {get_error(result)}"
+        else:
+            all_tasks[db_alias] = result
+
+    return render(request, 'inventory/workflow/tasks.html', {'all_tasks': all_tasks})
+
+
+async def workflow_progress_all(request):
+    workflows = {}
+    databases = get_active_databases()
+
+    results = await gather_databases(get_tasks, databases)
+    for db_alias, result in results.items():
+        # Unreachable databases are shown without tasks
+        workflows[db_alias] = get_workflow(db_alias, [] if isinstance(result, Exception) else result)
+
+    return render(request, "inventory/workflow/progress.html", {"workflows": workflows})
+
+
+@stamped(TASKS)
+async def overall_progress(request):
+    databases = get_active_databases()
+    progress = WorkflowProgress()
+
+    results = await gather_databases(get_workflow_progress, databases)
+    for result in results.values():
+        if not isinstance(result, Exception):
+            progress.merge(result)
+
+    return JsonResponse({
+        "progress": round(progress.percent, 2),
+        "is_complete": progress.is_complete,
+        "is_active": progress.is_active,
+        "unavailable": [db_alias for db_alias, result in results.items() if isinstance(result, Exception)],
+    })
+
+
+async def progress_updates(request):
+    # Long poll: hold the request until the progress changes, without holding a worker thread
+    since = request.GET.get('since')
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + settings.PROGRESS_LONG_POLL_TIMEOUT
+    while True:
+        token, update = await sync_to_async(query_databases, thread_sensitive=False)(get_progress_update, since)
+        if update is not None or loop.time() >= deadline:
+            break
+        await asyncio.sleep(settings.PROGRESS_POLL_INTERVAL)
+    update = update or {'since': token}
+    update['wait'] = 0
+    response = JsonResponse(update)
+    # never_cache does not wrap coroutines in this Django version
+    add_never_cache_headers(response)
+    return response
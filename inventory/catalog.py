@@ -0,0 +1,31 @@
+# inventory/catalog.py
+import hashlib
+from django.core.cache import caches
+from inventory.models import Product
+from inventory.stamps import get_generation
+from inventory.utils import get_products_page, search_products
+
+
+def read_through(db_alias, name, func, *args):
+    # Entries of older generations are never read again, and age out of the cache
+    args_hash = hashlib.md5(repr(args).encode()).hexdigest()
+    key = f"{db_alias}:{get_generation(db_alias)}:{name}:{args_hash}"
+    cache = caches['catalog']
+    value = cache.get(key)
+    if value is None:
+        value = func(db_alias, *args)
+        cache.set(key, value)
+    return value
+
+
+def get_page(version, after=None, before=None, size=None):
+    return read_through(version, 'page', get_products_page, after, before, size)
+
+
+def count_products(version):
+    return read_through(version, 'count', lambda db_alias: Product.objects.using(db_alias).count())
+
+
+def search(version, query, limit):
+    return read_through(version, 'search', search_products, query, limit)
+
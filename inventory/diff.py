@@ -0,0 +1,81 @@
+# inventory/diff.py
+from collections import namedtuple
+from django.conf import settings
+from django.db import connections
+from django.db.models.functions import Collate
+from inventory.models import Product
+from inventory.utils import EXPORT_FIELDS
+
+
+DiffRow = namedtuple('DiffRow', EXPORT_FIELDS)
+
+
+class DiffResult:
+
+    def __init__(self):
+        self.added = 0
+        self.removed = 0
+        self.changed = 0
+        self.unchanged = 0
+
+    def __str__(self):
+        return (
+            f"{self.added} added, {self.removed} removed, "
+            f"{self.changed} changed, {self.unchanged} unchanged"
+        )
+
+
+def iter_products_by_name(db_alias, chunk_size=None):
+    """
+    Yield the products of a database version ordered by name through a server-side cursor.
+    The order must match Python's string comparison for the merge join, hence the "C" collation
+    on PostgreSQL (SQLite compares the bytes already).
+    """
+    chunk_size = chunk_size if chunk_size else settings.EXPORT_CHUNK_SIZE
+    order = 'name'
+    if connections[db_alias].vendor == 'postgresql':
+        order = Collate('name', 'C')
+    products = Product.objects.using(db_alias).order_by(order).values_list(*EXPORT_FIELDS)
+    for row in products.iterator(chunk_size=chunk_size):
+        yield DiffRow(*row)
+
+
+def get_product(row):
+    return {field: getattr(row, field) for field in EXPORT_FIELDS}
+
+
+def diff_products(old_alias, new_alias, chunk_size=None, result=None):
+    """
+    Yield the differences between the products of two database versions as dicts with a 'change'
+    ('added', 'removed' or 'changed') and the product name, plus the product for added and removed
+    ones, or the changed fields as [old, new] pairs. Both versions are read in name order and merged
+    in one pass, so memory use does not depend on the number of products.
+    """
+    result = result if result is not None else DiffResult()
+    old_rows = iter_products_by_name(old_alias, chunk_size)
+    new_rows = iter_products_by_name(new_alias, chunk_size)
+    old = next(old_rows, None)
+    new = next(new_rows, None)
+    while old is not None or new is not None:
+        if new is None or (old is not None and old.name < new.name):
+            result.removed += 1
+            yield {'change': 'removed', 'name': old.name, 'product': get_product(old)}
+            old = next(old_rows, None)
+        elif old is None or new.name < old.name:
+            result.added += 1
+            yield {'change': 'added', 'name': new.name, 'product': get_product(new)}
+            new = next(new_rows, None)
+        else:
+            # The values are compared rather than the row hashes, which bulk updates of the products
+            # leave as they were
+            if old != new:
+                fields = {
+                    field: [getattr(old, field), getattr(new, field)]
+                    for field in EXPORT_FIELDS if getattr(old, field) != getattr(new, field)
+                }
+                result.changed += 1
+                yield {'change': 'changed', 'name': new.name, 'fields': fields}
+            else:
+                result.unchanged += 1
+            old = next(old_rows, None)
+            new = next(new_rows, None)
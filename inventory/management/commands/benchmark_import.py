@@ -0,0 +1,213 @@
+# inventory/management/commands/benchmark_import.py
+import os
+import sys
+import csv
+import random
+import resource
+import tempfile
+import time
+import multiprocessing
+from itertools import chain
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.conf import settings
+from inventory.models import Product
+from inventory.utils import (
+    delete_products, import_products, import_products_copy, import_products_stream, read_products_csv
+)
+
+
+STRATEGIES = ['update_or_create', 'batch', 'stream', 'copy']
+
+
+def generate_products_csv(file_path, rows, categories=20, seed=None):
+    """Write a synthetic product catalog with `rows` products spread over `categories` categories."""
+    rng = random.Random(seed)
+    with open(file_path, 'w', newline='', encoding='utf-8') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(['name', 'price', 'stock', 'category'])
+        for i in range(rows):
+            writer.writerow([
+                f"Product {i:08d}",
+                f"{rng.uniform(0.5, 2000):.2f}",
+                rng.randint(0, 1000),
+                f"Category {rng.randrange(categories):04d}"
+            ])
+
+
+def import_update_or_create(file_path, database_alias, batch_size=None, chunk_size=None):
+    # The original row-by-row import, kept as the baseline
+    for product_data in chain.from_iterable(read_products_csv(file_path, chunk_size=chunk_size)):
+        Product.objects.using(database_alias).update_or_create(
+            name=product_data.get('name'),
+            defaults={
+                'price': product_data.get('price', 0),
+                'stock': product_data.get('stock', 0),
+                'category': product_data.get('category', 'Unknown')
+            }
+        )
+
+
+def import_batch(file_path, database_alias, batch_size=None, chunk_size=None):
+    data = list(chain.from_iterable(read_products_csv(file_path, chunk_size=chunk_size)))
+    import_products(data, version=database_alias, batch_size=batch_size)
+
+
+def import_stream(file_path, database_alias, batch_size=None, chunk_size=None):
+    chunks = read_products_csv(file_path, chunk_size=chunk_size)
+    import_products_stream(chunks, version=database_alias, batch_size=batch_size)
+
+
+def import_copy(file_path, database_alias, batch_size=None, chunk_size=None):
+    import_products_copy(file_path, version=database_alias, batch_size=batch_size, chunk_size=chunk_size)
+
+
+def run_measured(sender, func, args, kwargs):
+    # Runs in a child process, whose peak resident memory is the one of this import only
+    try:
+        start = time.perf_counter()
+        func(*args, **kwargs)
+        seconds = time.perf_counter() - start
+        # Kilobytes on Linux, bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+        sender.send((seconds, peak, None))
+    except Exception as e:
+        sender.send((None, None, f"{type(e).__name__}: {e}"))
+    finally:
+        connections.close_all()
+        sender.close()
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark the product import strategies on a synthetic catalog. '
+        'WARNING: all products of the target database version are deleted.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--ver',
+            type=str,
+            required=True,
+            help='Database version to benchmark against (e.g., "1.0.0"). Its products are deleted.'
+        )
+        parser.add_argument(
+            '--rows',
+            type=int,
+            nargs='+',
+            default=[10000],
+            help='Number of products in the synthetic catalog (several sizes can be given).'
+        )
+        parser.add_argument(
+            '--categories',
+            type=int,
+            default=20,
+            help='Number of distinct categories in the synthetic catalog.'
+        )
+        parser.add_argument(
+            '--strategy',
+            type=str,
+            nargs='+',
+            choices=STRATEGIES,
+            default=STRATEGIES,
+            help='Import strategies to benchmark (default: all).'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.IMPORT_BATCH_SIZE,
+            help='Number of products written per bulk statement.'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=settings.IMPORT_CHUNK_SIZE,
+            help='Number of CSV rows parsed at a time.'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Seed of the synthetic catalog generator.'
+        )
+        parser.add_argument(
+            '--noinput', '--no-input',
+            action='store_false',
+            dest='interactive',
+            help='Do not ask for confirmation before deleting the products.'
+        )
+
+    def handle(self, *args, **options):
+        version = options['ver']
+        if version not in settings.DATABASES:
+            raise CommandError(f"Database version '{version}' does not exist in DATABASES settings.")
+
+        if options['interactive']:
+            confirm = input(f"All products of database '{version}' will be deleted. Type 'yes' to continue: ")
+            if confirm != 'yes':
+                raise CommandError("Benchmark cancelled.")
+
+        strategies = {
+            'update_or_create': import_update_or_create,
+            'batch': import_batch,
+            'stream': import_stream,
+            'copy': import_copy,
+        }
+        is_postgresql = connections[version].vendor == 'postgresql'
+        results = []
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for rows in options['rows']:
+                file_path = os.path.join(tmp_dir, f"products_{rows}.csv")
+                generate_products_csv(file_path, rows, categories=options['categories'], seed=options['seed'])
+                self.stdout.write(f"Generated {rows} products in {options['categories']} categories.")
+
+                for strategy in options['strategy']:
+                    if strategy == 'copy' and not is_postgresql:
+                        self.stdout.write(self.style.WARNING(
+                            f"Skipping 'copy' (database '{version}' is not PostgreSQL)."
+                        ))
+                        continue
+                    delete_products(version)
+                    # Import into an empty table, then re-import the same (unchanged) catalog
+                    for phase in ('insert', 'reimport'):
+                        self.stdout.write(f"Running '{strategy}' ({phase}) on {rows} products...")
+                        seconds, peak = self.measure(
+                            strategies[strategy], file_path, version,
+                            batch_size=options['batch_size'], chunk_size=options['chunk_size']
+                        )
+                        results.append((strategy, phase, rows, seconds, peak))
+
+        delete_products(version)
+        self.write_results(results)
+
+    def measure(self, func, *args, **kwargs):
+        """
+        Returns the wall-clock seconds and the peak resident memory (bytes) of a call. The call runs untraced
+        in a forked process, so that the peak includes the memory of C extensions (e.g. psycopg2 COPY buffers)
+        and not the one of the previous runs.
+        """
+        # The child opens its own database connections
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        receiver, sender = context.Pipe(duplex=False)
+        process = context.Process(target=run_measured, args=(sender, func, args, kwargs))
+        process.start()
+        sender.close()
+        try:
+            seconds, peak, error = receiver.recv()
+        except EOFError:
+            seconds, peak, error = None, None, f"the benchmark process exited with code {process.exitcode}"
+        process.join()
+        if error:
+            raise CommandError(f"Benchmark of '{func.__name__}' failed: {error}")
+        return seconds, peak
+
+    def write_results(self, results):
+        self.stdout.write("\n=== Import Benchmark ===")
+        self.stdout.write(f"{'Strategy':<18}{'Phase':<10}{'Rows':>10}{'Seconds':>10}{'Rows/s':>12}{'Peak RSS MiB':>14}")
+        for strategy, phase, rows, seconds, peak in results:
+            rate = rows / seconds if seconds else 0
+            self.stdout.write(
+                f"{strategy:<18}{phase:<10}{rows:>10}{seconds:>10.2f}{rate:>12.0f}{peak / 2 ** 20:>14.1f}"
+            )
@@ -1,7 +1,9 @@
 # inventory/management/commands/clear_products.py
 from django.core.management.base import BaseCommand, CommandError
 from django.conf import settings
-from inventory.models import Product  # Ensure Product model is correctly imported
+from django.db import transaction
+from inventory.models import ImportedFile
+from inventory.utils import delete_products
 
 
 class Command(BaseCommand):
@@ -34,7 +36,10 @@ class Command(BaseCommand):
             self.stdout.write(f"Clearing all Product instances from database '{alias}'...")
 
             try:
-                count, _ = Product.objects.using(alias).all().delete()
+                with transaction.atomic(using=alias):
+                    count = delete_products(alias)
+                    # Forget the imported files so that the next import reloads them
+                    ImportedFile.objects.using(alias).all().delete()
                 self.stdout.write(self.style.SUCCESS(
                     f"Successfully cleared {count} Product instances from database '{alias}'."
                 ))
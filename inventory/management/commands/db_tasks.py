@@ -20,6 +20,11 @@ class Command(BaseCommand):
             choices=['active', 'complete', 'revoked', 'all'],
             help="Purge specific types of tasks: 'active', 'completed', 'revoked', or 'all'."
         )
+        parser.add_argument(
+            '--revoke',
+            action='store_true',
+            help="Revoke the pending and running tasks (running ones are stopped), the workflows resume from their checkpoints when started again."
+        )
 
     def handle(self, *args, **options):
         # Initialize Celery app
@@ -42,6 +47,13 @@ class Command(BaseCommand):
         if options['purge']:
             self.purge_tasks(celery_app, options['purge'], active_tasks, reserved_tasks, scheduled_tasks)
             
+        # Revoked before being deleted, so that their running Celery tasks stop
+        if options['revoke']:
+            self.stdout.write("\n=== Revoking Tasks in databases ===")
+            db_aliases = [alias for alias in settings.DATABASES.keys() if alias != 'default']
+            for db_alias in db_aliases:
+                self.revoke_tasks(celery_app, db_alias=db_alias)
+
         if options['delete']:
             self.stdout.write("\n=== Deleting Tasks from databases ===")
             db_aliases = [alias for alias in settings.DATABASES.keys() if alias != 'default']
@@ -109,4 +121,17 @@ class Command(BaseCommand):
             count = Task.objects.using(db_alias).all().delete()[0]
             self.stdout.write(f"{count} tasks have been deleted from database '{db_alias}'.")
         else:
-            self.stderr.write(f"\nUnrecognized option for --delete: '{option}'")
\ No newline at end of file
+            self.stderr.write(f"\nUnrecognized option for --delete: '{option}'")
+
+    def revoke_tasks(self, celery_app, db_alias):
+        active = [Task.Status.PENDING, Task.Status.RUNNING]
+        # Saved one by one, so that the progress cache and the change stamps follow
+        tasks = Task.objects.using(db_alias).filter(status__in=active)
+        for task in tasks:
+            task.status = Task.Status.REVOKED
+            task.save(using=db_alias, update_fields=['status', 'updated_on'])
+        # Terminates the running tasks in the prefork pool, the tasks stop themselves in the other pools
+        task_ids = [task.task_id for task in tasks if task.task_id]
+        if task_ids:
+            celery_app.control.revoke(task_ids, terminate=True)
+        self.stdout.write(f"{len(tasks)} tasks have been revoked in database '{db_alias}'.")
@@ -0,0 +1,68 @@
+# inventory/management/commands/diff_versions.py
+import json
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from inventory.diff import DiffResult, diff_products
+
+
+class Command(BaseCommand):
+    help = 'Show the products added, removed and changed between two database versions.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'old',
+            type=str,
+            help='Database version to compare from (e.g., "1.0.0").'
+        )
+        parser.add_argument(
+            'new',
+            type=str,
+            help='Database version to compare to (e.g., "1.1.0").'
+        )
+        parser.add_argument(
+            '--format',
+            type=str,
+            choices=['text', 'jsonl'],
+            default='text',
+            help='Output format: one line per change as text or as JSON Lines.'
+        )
+        parser.add_argument(
+            '--summary',
+            action='store_true',
+            help='Only count the changes.'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=settings.EXPORT_CHUNK_SIZE,
+            help='Number of products fetched per round trip from each version.'
+        )
+
+    def handle(self, *args, **options):
+        for version in (options['old'], options['new']):
+            if version not in settings.DATABASES:
+                raise CommandError(f"Database version '{version}' does not exist in DATABASES settings.")
+
+        result = DiffResult()
+        changes = diff_products(options['old'], options['new'], chunk_size=options['chunk_size'], result=result)
+        for change in changes:
+            if options['summary']:
+                continue
+            if options['format'] == 'jsonl':
+                self.stdout.write(json.dumps(change, default=str))
+            else:
+                self.stdout.write(self.format_change(change))
+
+        summary = f"{options['old']} -> {options['new']}: {result}"
+        if options['format'] == 'jsonl' and not options['summary']:
+            self.stderr.write(summary)
+        else:
+            self.stdout.write(self.style.SUCCESS(summary))
+
+    def format_change(self, change):
+        if change['change'] == 'changed':
+            fields = ", ".join(f"{field}: {old} -> {new}" for field, (old, new) in change['fields'].items())
+            return f"~ {change['name']} ({fields})"
+        product = change['product']
+        sign = '+' if change['change'] == 'added' else '-'
+        return f"{sign} {change['name']} (price: {product['price']}, stock: {product['stock']}, category: {product['category']})"
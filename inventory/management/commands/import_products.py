@@ -1,11 +1,32 @@
 # inventory/management/commands/import_products.py
 import os
-import csv
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from io import StringIO
+from itertools import chain
+import django
 from django.core.management.base import BaseCommand, CommandError
-from inventory.utils import import_products
+from django.db import connections
+from inventory.utils import (
+    ImportResult, RejectedRows, check_import_manifest, import_products, import_products_copy, import_products_stream,
+    read_products_csv, update_import_manifest
+)
 from django.conf import settings
 
 
+def init_worker():
+    # Each worker process sets up Django and opens its own database connections
+    django.setup()
+    connections.close_all()
+
+
+def import_version_worker(database_alias, csv_files, import_options):
+    stdout, stderr = StringIO(), StringIO()
+    command = Command(stdout=stdout, stderr=stderr)
+    summary = command.import_version(database_alias, csv_files, **import_options)
+    connections.close_all()
+    return summary, stdout.getvalue(), stderr.getvalue()
+
+
 class Command(BaseCommand):
     help = 'Import products from CSV files in the IMPORT_PATH into the specified or all database versions.'
 
@@ -22,10 +43,50 @@ class Command(BaseCommand):
             default=None, 
             help='Name of the CSV file containing product data.'
         )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.IMPORT_BATCH_SIZE,
+            help='Number of products written per bulk statement.'
+        )
+        parser.add_argument(
+            '--engine',
+            type=str,
+            choices=['batch', 'stream', 'copy'],
+            default='batch',
+            help=(
+                "Import engine: 'batch' loads each file in one transaction, 'stream' writes chunks while parsing, "
+                "'copy' uses PostgreSQL COPY through a staging table (batch path on other databases)."
+            )
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=settings.IMPORT_CHUNK_SIZE,
+            help='Number of CSV rows parsed and written at a time by the stream and copy engines.'
+        )
+        parser.add_argument(
+            '--jobs',
+            type=int,
+            default=1,
+            help='Number of database versions imported concurrently, each in its own process.'
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Import every file, even those unchanged since their last import.'
+        )
 
     def handle(self, *args, **options):
         version = options['ver']
         file_name = options['file']
+        jobs = options['jobs']
+        import_options = {
+            'engine': options['engine'],
+            'batch_size': options['batch_size'],
+            'chunk_size': options['chunk_size'],
+            'force': options['force'],
+        }
         import_path = settings.IMPORT_PATH
 
         if not os.path.exists(import_path):
@@ -41,6 +102,7 @@ class Command(BaseCommand):
             # Process all database versions in settings.DATABASES
             subfolders = [os.path.join(import_path, alias) for alias in settings.DATABASES.keys() if alias != 'default']
 
+        versions = []
         for subfolder in subfolders:
             if not os.path.exists(subfolder) or not os.path.isdir(subfolder):
                 self.stdout.write(self.style.WARNING(f"Skipping '{subfolder}' (does not exist or is not a directory)."))
@@ -60,41 +122,97 @@ class Command(BaseCommand):
                 self.stdout.write(self.style.WARNING(f"No CSV files found in '{subfolder}'."))
                 continue
 
-            database_alias = os.path.basename(subfolder)
-            self.stdout.write(f"Processing database alias '{database_alias}' from folder '{subfolder}'.")
+            versions.append((os.path.basename(subfolder), csv_files))
 
-            for csv_file in csv_files:
-                self.stdout.write(f"Importing from '{csv_file}'...")
+        if jobs > 1 and len(versions) > 1:
+            summaries = self.import_versions_parallel(versions, jobs, import_options)
+        else:
+            summaries = [self.import_version(alias, csv_files, **import_options) for alias, csv_files in versions]
+
+        if summaries:
+            self.write_summary(summaries)
+
+    def import_versions_parallel(self, versions, jobs, import_options):
+        """Imports each database version in a separate worker process."""
+        summaries = []
+        # Forked workers must not share the parent's database connections
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=jobs, initializer=init_worker) as executor:
+            futures = {
+                executor.submit(import_version_worker, alias, csv_files, import_options): alias
+                for alias, csv_files in versions
+            }
+            for future in as_completed(futures):
+                alias = futures[future]
                 try:
-                    self.import_csv_file(csv_file, database_alias)
+                    summary, stdout, stderr = future.result()
                 except Exception as e:
-                    self.stderr.write(self.style.ERROR(f"Failed to import from '{csv_file}': {e}"))
+                    summary = {'alias': alias, 'result': ImportResult(), 'errors': [str(e)], 'skipped': 0}
+                    stdout, stderr = "", ""
+                self.stdout.write(stdout, ending="")
+                self.stderr.write(stderr, ending="")
+                summaries.append(summary)
+        return sorted(summaries, key=lambda summary: summary['alias'])
+
+    def import_version(self, database_alias, csv_files, force=False, **import_options):
+        """Imports the new or changed CSV files of a database version and returns the combined result and errors."""
+        summary = {'alias': database_alias, 'result': ImportResult(), 'errors': [], 'skipped': 0}
+        subfolder = os.path.dirname(csv_files[0])
+        self.stdout.write(f"Processing database alias '{database_alias}' from folder '{subfolder}'.")
+
+        for csv_file in csv_files:
+            try:
+                is_unchanged, fingerprint = check_import_manifest(csv_file, database_alias)
+                if is_unchanged and not force:
+                    self.stdout.write(f"Skipping '{csv_file}' (unchanged since its last import).")
+                    summary['skipped'] += 1
+                    continue
+                self.stdout.write(f"Importing from '{csv_file}'...")
+                result = self.import_csv_file(csv_file, database_alias, **import_options)
+                update_import_manifest(csv_file, database_alias, fingerprint, rows=result.total)
+                summary['result'].merge(result)
+            except Exception as e:
+                self.stderr.write(self.style.ERROR(f"Failed to import from '{csv_file}': {e}"))
+                summary['errors'].append(f"{os.path.basename(csv_file)}: {e}")
+        return summary
+
+    def write_summary(self, summaries):
+        self.stdout.write("\n=== Import Summary ===")
+        for summary in summaries:
+            line = f"- {summary['alias']}: {summary['result']}"
+            if summary['skipped']:
+                line += f", {summary['skipped']} files unchanged"
+            if summary['errors']:
+                self.stdout.write(self.style.ERROR(f"{line} ({len(summary['errors'])} failed)"))
+                for error in summary['errors']:
+                    self.stdout.write(f"    {error}")
+            else:
+                self.stdout.write(self.style.SUCCESS(line))
 
 
-    def import_csv_file(self, file_path, database_alias):
+    def import_csv_file(self, file_path, database_alias, engine='batch', batch_size=None, chunk_size=None):
         """Handles the import of a single CSV file into the specified database alias."""
-        with open(file_path, newline='', encoding='utf-8') as csvfile:
-            reader = csv.DictReader(csvfile)
-            data = []
-
-            for row in reader:
-                try:
-                    # Prepare data for each product
-                    product_data = {
-                        'name': row['name'],
-                        'price': float(row['price']),
-                        'stock': int(row['stock']),
-                        'category': row.get('category', 'Unknown')  # Handle missing category gracefully
-                    }
-                    data.append(product_data)
-                except KeyError as e:
-                    raise CommandError(f"Missing required column {e} in file '{file_path}'.")
-
-            # Call the utility function to import the data
-            import_products(data, version=database_alias)
-
-            self.stdout.write(self.style.SUCCESS(
-                f"Successfully imported {len(data)} products into '{database_alias}' from '{file_path}'."
-            ))
-
-            
\ No newline at end of file
+        rejected_path = os.path.join(settings.REJECTED_PATH, database_alias, os.path.basename(file_path))
+        try:
+            with RejectedRows(path=rejected_path) as rejected:
+                chunks = read_products_csv(file_path, chunk_size=chunk_size, on_reject=rejected)
+                if engine == 'copy':
+                    result = import_products_copy(
+                        file_path, version=database_alias, batch_size=batch_size, chunk_size=chunk_size,
+                        on_reject=rejected
+                    )
+                elif engine == 'stream':
+                    result = import_products_stream(chunks, version=database_alias, batch_size=batch_size)
+                else:
+                    data = list(chain.from_iterable(chunks))
+                    result = import_products(data, version=database_alias, batch_size=batch_size)
+                result.rejected = rejected.count
+        except KeyError as e:
+            raise CommandError(f"Missing required column {e} in file '{file_path}'.")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Successfully imported {result.total} products into '{database_alias}' from '{file_path}' ({result})."
+        ))
+        if result.rejected:
+            self.stdout.write(self.style.WARNING(f"Rejected rows of '{file_path}' written to '{rejected_path}'."))
+        return result
@@ -0,0 +1,26 @@
+# Generated by Django 3.2.5 on 2026-10-18 10:12
+
+from django.db import migrations, models
+
+
+def remove_duplicate_products(apps, schema_editor):
+    # Keep the latest product of each name
+    Product = apps.get_model('inventory', 'Product')
+    db_alias = schema_editor.connection.alias
+    latest = Product.objects.using(db_alias).values('name').annotate(last=models.Max('pk')).values('last')
+    Product.objects.using(db_alias).exclude(pk__in=latest).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0008_alter_task_type'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_products, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='product',
+            constraint=models.UniqueConstraint(fields=('name',), name='unique_product_name'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 3.2.5 on 2026-10-18 12:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0009_product_unique_product_name'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportedFile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(help_text='Name of the imported CSV file', max_length=255, unique=True)),
+                ('size', models.PositiveBigIntegerField(help_text='Size of the file in bytes when it was imported')),
+                ('mtime', models.FloatField(help_text='Modification time of the file when it was imported')),
+                ('content_hash', models.CharField(help_text='SHA-256 of the file contents', max_length=64)),
+                ('rows', models.PositiveIntegerField(default=0, help_text='Number of products read from the file')),
+                ('imported_on', models.DateTimeField(auto_now=True, help_text='Timestamp when the file was last imported')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='row_hash',
+            field=models.CharField(blank=True, default='', help_text='Hash of the imported row values', max_length=32),
+        ),
+    ]
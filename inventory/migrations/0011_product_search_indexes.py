@@ -0,0 +1,36 @@
+from django.db import migrations
+
+
+# Trigram indexes for the product search: on the names for similarity (%), and on the upper-cased
+# names and categories for the case-insensitive substring matches (UPPER(...) LIKE UPPER(...))
+SEARCH_INDEXES = {
+    'inventory_product_name_trgm': '("name" gin_trgm_ops)',
+    'inventory_product_name_upper_trgm': '(UPPER("name"::text) gin_trgm_ops)',
+    'inventory_product_category_upper_trgm': '(UPPER("category"::text) gin_trgm_ops)',
+}
+
+
+def create_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for name, expression in SEARCH_INDEXES.items():
+        schema_editor.execute(f'CREATE INDEX IF NOT EXISTS "{name}" ON "inventory_product" USING gin {expression}')
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name in SEARCH_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS "{name}"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0010_importedfile_product_row_hash'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
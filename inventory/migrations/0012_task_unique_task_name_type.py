@@ -0,0 +1,24 @@
+from django.db import migrations, models
+
+
+def remove_duplicate_tasks(apps, schema_editor):
+    # Keep the latest task of each name and type
+    Task = apps.get_model('inventory', 'Task')
+    db_alias = schema_editor.connection.alias
+    latest = Task.objects.using(db_alias).values('name', 'type').annotate(last=models.Max('pk')).values('last')
+    Task.objects.using(db_alias).exclude(pk__in=latest).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0011_product_search_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_tasks, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='task',
+            constraint=models.UniqueConstraint(fields=('name', 'type'), name='unique_task_name_type'),
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0012_task_unique_task_name_type'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='checkpoint',
+            field=models.PositiveIntegerField(default=0, help_text='Iteration the task resumes from when restarted'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+from django.db import migrations, models
+
+
+def create_generation(apps, schema_editor):
+    CatalogGeneration = apps.get_model('inventory', 'CatalogGeneration')
+    CatalogGeneration.objects.using(schema_editor.connection.alias).get_or_create(pk=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0013_task_checkpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogGeneration',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.PositiveBigIntegerField(default=0, help_text='Number of changes of the products')),
+                ('changed_on', models.DateTimeField(auto_now=True, help_text='Timestamp when the products last changed')),
+            ],
+        ),
+        migrations.RunPython(create_generation, migrations.RunPython.noop),
+    ]
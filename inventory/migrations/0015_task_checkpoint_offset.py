@@ -0,0 +1,18 @@
+# Generated by Django 3.2.5 on 2026-10-18 13:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0014_cataloggeneration'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='checkpoint_offset',
+            field=models.PositiveBigIntegerField(default=0, help_text='Size of the output file of the task at its checkpoint'),
+        ),
+    ]
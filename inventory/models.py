@@ -1,18 +1,68 @@
 # inventory/models.py
+import hashlib
+from decimal import ROUND_HALF_UP, Decimal
 from django.db import models
 from common.utils import date_to_str, datetime_to_str
 
 
+# Separates the fields hashed into Product.row_hash (also used by the SQL merge)
+ROW_HASH_SEPARATOR = '\x1f'
+
+
+def product_row_hash(product):
+    """Hash of the values of a product (or of a row with the same fields) as they are stored."""
+    price_field = Product._meta.get_field('price')
+    price = price_field.to_python(product.price).quantize(
+        Decimal(1).scaleb(-price_field.decimal_places), rounding=ROUND_HALF_UP
+    )
+    values = (product.name, str(price), str(int(product.stock)), product.category)
+    return hashlib.md5(ROW_HASH_SEPARATOR.join(values).encode('utf-8')).hexdigest()
+
+
 class Product(models.Model):
     name = models.CharField(max_length=255)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     stock = models.IntegerField()
     category = models.CharField(max_length=255, default="")    
+    row_hash = models.CharField(max_length=32, blank=True, default="", help_text="Hash of the imported row values")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['name'], name='unique_product_name'),
+        ]
+
+    def __str__(self):
+        return self.name
+
+    def save(self, *args, **kwargs):
+        # Imports only compare the hashes, keep them in line with the edits made outside of the imports
+        self.row_hash = product_row_hash(self)
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'row_hash'}
+        super().save(*args, **kwargs)
+
+
+class ImportedFile(models.Model):
+    name = models.CharField(max_length=255, unique=True, help_text="Name of the imported CSV file")
+    size = models.PositiveBigIntegerField(help_text="Size of the file in bytes when it was imported")
+    mtime = models.FloatField(help_text="Modification time of the file when it was imported")
+    content_hash = models.CharField(max_length=64, help_text="SHA-256 of the file contents")
+    rows = models.PositiveIntegerField(default=0, help_text="Number of products read from the file")
+    imported_on = models.DateTimeField(auto_now=True, help_text="Timestamp when the file was last imported")
 
     def __str__(self):
         return self.name
 
 
+class CatalogGeneration(models.Model):
+    # A single row per database version, changed in the same transaction as its products
+    value = models.PositiveBigIntegerField(default=0, help_text="Number of changes of the products")
+    changed_on = models.DateTimeField(auto_now=True, help_text="Timestamp when the products last changed")
+
+    def __str__(self):
+        return f"Generation {self.value}"
+
+
 class AbstractTask(models.Model):
     class Status(models.TextChoices):
         PENDING = 'PENDING', 'Pending'
@@ -35,6 +85,10 @@ class AbstractTask(models.Model):
     name = models.CharField(max_length=255, help_text="Name of the task")
     task_id = models.CharField(max_length=255, null=True, blank=True)  # Celery task ID
     current = models.PositiveIntegerField(default=0, help_text="Current iteration of the task")
+    checkpoint = models.PositiveIntegerField(default=0, help_text="Iteration the task resumes from when restarted")
+    checkpoint_offset = models.PositiveBigIntegerField(
+        default=0, help_text="Size of the output file of the task at its checkpoint"
+    )
     total = models.PositiveIntegerField(help_text="Total iterations of the task")
     status = models.CharField(
         max_length=20,
@@ -95,6 +149,9 @@ class AbstractTask(models.Model):
 class Task(AbstractTask):
     class Meta:
         ordering = ['triggered_on']
+        constraints = [
+            models.UniqueConstraint(fields=['name', 'type'], name='unique_task_name_type'),
+        ]
         verbose_name = 'Task'
         verbose_name_plural = 'Tasks'
     
@@ -0,0 +1,170 @@
+# inventory/progress.py
+import json
+import logging
+from collections import namedtuple
+import redis
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from inventory.models import Task
+
+
+logger = logging.getLogger(__name__)
+
+# Compact progress of a task, as kept in the cache (quacks like a Task for WorkflowProgress)
+TaskState = namedtuple('TaskState', ['pk', 'type', 'status', 'current', 'total'])
+
+# Set once the hash holds every task of the database, tasks published before that are not enough
+READY_FIELD = '_ready'
+
+_client = None
+
+
+def get_client():
+    global _client
+    if not settings.PROGRESS_REDIS_URL:
+        return None
+    if _client is None:
+        _client = redis.Redis.from_url(
+            settings.PROGRESS_REDIS_URL,
+            socket_timeout=settings.PROGRESS_REDIS_TIMEOUT,
+            socket_connect_timeout=settings.PROGRESS_REDIS_TIMEOUT
+        )
+    return _client
+
+
+def get_key(db_alias):
+    return f"{settings.PROGRESS_REDIS_PREFIX}:{db_alias}"
+
+
+def dump_state(task):
+    return json.dumps([task.type, task.status, task.current, task.total], separators=(',', ':'))
+
+
+def load_state(pk, value):
+    return TaskState(int(pk), *json.loads(value))
+
+
+def publish_task(task, db_alias):
+    """Write the progress of a task into the hash of its database, and keep the hash alive."""
+    publish_tasks([task], db_alias)
+
+
+def publish_tasks(tasks, db_alias):
+    client = get_client()
+    if client is None or not tasks:
+        return
+    try:
+        key = get_key(db_alias)
+        with client.pipeline() as pipe:
+            pipe.hset(key, mapping={task.pk: dump_state(task) for task in tasks})
+            pipe.expire(key, settings.PROGRESS_CACHE_TTL)
+            pipe.execute()
+    except redis.RedisError as e:
+        logger.warning(f"Could not publish the progress of {len(tasks)} tasks ({db_alias}): {e}")
+
+
+def forget_task(pk, db_alias):
+    client = get_client()
+    if client is None:
+        return
+    try:
+        client.hdel(get_key(db_alias), pk)
+    except redis.RedisError as e:
+        logger.warning(f"Could not remove the progress of task {pk} ({db_alias}): {e}")
+
+
+def get_snapshot_key(token):
+    return f"{settings.PROGRESS_REDIS_PREFIX}:snapshot:{token}"
+
+
+def save_snapshot(token, snapshot):
+    """
+    Keep a progress snapshot for the next request of each client, in Redis so that every process can
+    diff against it (in the local cache of the process when Redis is disabled or unavailable).
+    """
+    timeout = settings.PROGRESS_LONG_POLL_TIMEOUT * 4
+    client = get_client()
+    if client is not None:
+        try:
+            client.set(get_snapshot_key(token), json.dumps(snapshot), ex=timeout)
+            return
+        except redis.RedisError as e:
+            logger.warning(f"Could not save the progress snapshot: {e}")
+    cache.set(get_snapshot_key(token), snapshot, timeout)
+
+
+def load_snapshot(token):
+    client = get_client()
+    if client is not None:
+        try:
+            value = client.get(get_snapshot_key(token))
+            if value is not None:
+                return json.loads(value)
+        except redis.RedisError as e:
+            logger.warning(f"Could not read the progress snapshot: {e}")
+    return cache.get(get_snapshot_key(token))
+
+
+def load_tasks(client, db_alias):
+    # Fill the hash from the database without overwriting the tasks published meanwhile
+    key = get_key(db_alias)
+    tasks = Task.objects.using(db_alias).only('pk', 'type', 'status', 'current', 'total')
+    with client.pipeline() as pipe:
+        for task in tasks:
+            pipe.hsetnx(key, task.pk, dump_state(task))
+        pipe.hset(key, READY_FIELD, 1)
+        pipe.expire(key, settings.PROGRESS_CACHE_TTL)
+        pipe.execute()
+    return client.hgetall(key)
+
+
+def read_task_states(db_alias):
+    fields = ('pk', 'type', 'status', 'current', 'total')
+    return [TaskState(*row) for row in Task.objects.using(db_alias).order_by().values_list(*fields)]
+
+
+def get_task_states(db_alias):
+    """
+    Returns the progress of all tasks of a database from the cache (filled from the database on a miss),
+    or None when the cache is disabled or unavailable.
+    """
+    client = get_client()
+    if client is None:
+        return None
+    try:
+        values = client.hgetall(get_key(db_alias))
+        if READY_FIELD.encode() not in values:
+            values = load_tasks(client, db_alias)
+    except redis.RedisError as e:
+        logger.warning(f"Could not read the progress of {db_alias}: {e}")
+        return None
+    return [load_state(pk, value) for pk, value in values.items() if pk != READY_FIELD.encode()]
+
+
+def get_task_state(db_alias, pk):
+    """Returns the cached progress of a task, or None when it is not cached."""
+    client = get_client()
+    if client is None:
+        return None
+    try:
+        ready, value = client.hmget(get_key(db_alias), READY_FIELD, pk)
+    except redis.RedisError as e:
+        logger.warning(f"Could not read the progress of task {pk} ({db_alias}): {e}")
+        return None
+    return load_state(pk, value) if ready and value else None
+
+
+# Published once the change is committed, so that rolled back saves are never shown
+@receiver(post_save, sender=Task)
+def task_saved(sender, instance, using, **kwargs):
+    state = TaskState(instance.pk, instance.type, instance.status, instance.current, instance.total)
+    transaction.on_commit(lambda: publish_task(state, using), using=using)
+
+
+@receiver(post_delete, sender=Task)
+def task_deleted(sender, instance, using, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: forget_task(pk, using), using=using)
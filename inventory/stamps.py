@@ -0,0 +1,118 @@
+# inventory/stamps.py
+import time
+import hashlib
+import logging
+import redis
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone as tz
+from inventory.models import CatalogGeneration, Product, Task
+from inventory.progress import get_client
+
+
+logger = logging.getLogger(__name__)
+
+# What changed in a database version
+TASKS = 'tasks'
+PRODUCTS = 'products'
+
+
+def bump_stamp(db_alias, scope):
+    """Record that the tasks or products of a database changed (a counter and the time of the change)."""
+    client = get_client()
+    if client is None:
+        return
+    fields = (f"{db_alias}:{scope}:n", f"{db_alias}:{scope}:t")
+    try:
+        with client.pipeline() as pipe:
+            pipe.hincrby(settings.STAMPS_REDIS_KEY, fields[0], 1)
+            pipe.hset(settings.STAMPS_REDIS_KEY, fields[1], time.time())
+            pipe.execute()
+    except redis.RedisError as e:
+        logger.warning(f"Could not bump the {scope} stamp of {db_alias}: {e}")
+        # The stamp left as it was would hide the change, a missing one starts over when it is read
+        try:
+            client.hdel(settings.STAMPS_REDIS_KEY, *fields)
+        except redis.RedisError as e:
+            logger.warning(f"Could not remove the {scope} stamp of {db_alias}: {e}")
+
+
+def get_stamps(scope, databases):
+    """
+    Returns the (counter, time) stamp of `scope` per database in one lookup, or None when the stamps are
+    unavailable. Databases never bumped get a stamp starting now.
+    """
+    client = get_client()
+    if client is None:
+        return None
+    fields = [f"{db_alias}:{scope}:{part}" for db_alias in databases for part in ('n', 't')]
+    try:
+        values = client.hmget(settings.STAMPS_REDIS_KEY, fields) if fields else []
+        missing = [field for field, value in zip(fields[1::2], values[1::2]) if value is None]
+        if missing:
+            now = time.time()
+            with client.pipeline() as pipe:
+                for field in missing:
+                    pipe.hsetnx(settings.STAMPS_REDIS_KEY, field, now)
+                pipe.hmget(settings.STAMPS_REDIS_KEY, fields)
+                values = pipe.execute()[-1]
+    except redis.RedisError as e:
+        logger.warning(f"Could not read the {scope} stamps: {e}")
+        return None
+    return {
+        db_alias: (int(values[2 * i] or 0), float(values[2 * i + 1]))
+        for i, db_alias in enumerate(databases)
+    }
+
+
+def get_stamp_validators(scope, databases, *extra):
+    """Returns the ETag and Last-Modified (epoch seconds) of `scope` in the databases, or (None, None)."""
+    stamps = get_stamps(scope, databases)
+    if stamps is None:
+        return None, None
+    key = ':'.join([scope, *extra, *(f"{db_alias}={n}.{t}" for db_alias, (n, t) in sorted(stamps.items()))])
+    last_modified = int(max((t for _, t in stamps.values()), default=0))
+    return f'"{hashlib.md5(key.encode()).hexdigest()}"', last_modified
+
+
+def get_generation_stamp(db_alias):
+    """
+    Returns the (counter, time) of the last change of the products of a database version: its products
+    stamp, or the generation row kept in the database itself when the stamps are unavailable.
+    """
+    stamps = get_stamps(PRODUCTS, [db_alias])
+    if stamps is not None:
+        return stamps[db_alias]
+    generation = CatalogGeneration.objects.using(db_alias).filter(pk=1).values_list('value', 'changed_on').first()
+    return (generation[0], generation[1].timestamp()) if generation else (0, 0.0)
+
+
+def get_generation(db_alias):
+    return "{}.{}".format(*get_generation_stamp(db_alias))
+
+
+def bump_generation(db_alias):
+    """
+    Record that the products of a database version changed, so that their cached reads are not used.
+    Call it in the transaction changing the products, the stamp is bumped once it is committed.
+    """
+    generations = CatalogGeneration.objects.using(db_alias)
+    if not generations.filter(pk=1).update(value=F('value') + 1, changed_on=tz.now()):
+        generations.get_or_create(pk=1, defaults={'value': 1})
+    transaction.on_commit(lambda: bump_stamp(db_alias, PRODUCTS), using=db_alias)
+
+
+@receiver(post_save, sender=Task)
+@receiver(post_delete, sender=Task)
+def task_changed(sender, instance, using, **kwargs):
+    transaction.on_commit(lambda: bump_stamp(using, TASKS), using=using)
+
+
+# Bulk imports and deletes of products do not send signals and bump the generation themselves
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def product_changed(sender, instance, using, **kwargs):
+    bump_generation(using)
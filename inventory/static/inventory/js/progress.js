@@ -17,15 +17,55 @@ function updateNavbarProgressBar(data) {
     }
 }
 
-function pollOverallProgress() {
-    fetch("/overall-progress/")
+// Progress of every workflow and task, as last sent
+const progressState = { workflows: {}, tasks: {} };
+
+function isUnavailable(section, key) {
+    const dbAlias = section === "workflows" ? key : key.substring(0, key.lastIndexOf("-"));
+    const workflow = progressState.workflows[dbAlias];
+    return Boolean(workflow && workflow.unavailable);
+}
+
+// Keeps progressState up to date, and sets in data.removed what is gone from it
+function applyProgressUpdate(data) {
+    const removed = data.removed || {};
+    for (const section of ["workflows", "tasks"]) {
+        Object.assign(progressState[section], data[section] || {});
+    }
+    for (const section of ["workflows", "tasks"]) {
+        const changed = data[section] || {};
+        // What a full update does not list is gone, except the tasks of the databases not answering
+        const gone = data.full
+            ? Object.keys(progressState[section]).filter(key => !(key in changed) && !isUnavailable(section, key))
+            : (removed[section] || []);
+        for (const key of gone) {
+            delete progressState[section][key];
+        }
+        removed[section] = gone;
+    }
+    data.removed = removed;
+}
+
+// One request at a time for all workflows and tasks, answered when the progress changes.
+// Pages listen to the "progress-update" event for the workflows and tasks that changed or were removed.
+function pollProgressUpdates(since) {
+    const url = since ? `/progress-updates/?since=${since}` : "/progress-updates/";
+    fetch(url)
         .then(response => response.json())
         .then(data => {
-            updateNavbarProgressBar(data);
+            if (data.overall) {
+                applyProgressUpdate(data);
+                updateNavbarProgressBar(data.overall);
+                document.dispatchEvent(new CustomEvent("progress-update", { detail: data }));
+            }
+            setTimeout(() => pollProgressUpdates(data.since), data.wait || 0);
         })
-        .catch(error => console.error("Error fetching overall progress:", error));
+        .catch(error => {
+            console.error("Error fetching progress updates:", error);
+            setTimeout(() => pollProgressUpdates(since), 5000);
+        });
 }
 
 document.addEventListener("DOMContentLoaded", function () {
-    setInterval(pollOverallProgress, 2000);
+    pollProgressUpdates(null);
 });
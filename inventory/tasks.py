@@ -1,23 +1,95 @@
+import os
+import time
+from datetime import timedelta
 from django.conf import settings
+from django.db import IntegrityError, connections, transaction
+from django.db.models import Count, Max, Q
+from django.db.models.signals import post_save
 from django.utils import timezone as tz
-from celery import shared_task
+from celery import group, shared_task, states
+from celery.exceptions import Ignore
 from celery_progress.backend import ProgressRecorder
-from inventory.workflows import WorkflowStep, Workflow
+from inventory.workflows import DagWorkflow
 from inventory.models import Task, Product
+from inventory.progress import publish_tasks
+from inventory.stamps import TASKS, bump_stamp
+from inventory.utils import (
+    RejectedRows, assemble_export, export_products, get_export_path, get_export_range, import_products,
+    plan_import_shards, read_products_csv, skip_segments
+)
+
+
+# Advisory lock held while the tasks of a workflow are provisioned (each version has its own database)
+WORKFLOW_LOCK_ID = 0x696e76
+
+
+def stop_task(celery_task):
+    celery_task.update_state(state=states.REVOKED)
+    raise Ignore()
+
+
+def stop_if_revoked(celery_task, db_task, db_alias):
+    """
+    Stops a task, and the rest of its workflow, once its database task is revoked (or deleted). Not every
+    pool of the workers terminates running tasks (the threads one does not), and the tasks queued by a
+    workflow are not known to Celery by id before they start.
+    """
+    if not Task.objects.using(db_alias).filter(pk=db_task.pk).exclude(status=Task.Status.REVOKED).exists():
+        stop_task(celery_task)
 
 
 class TaskProgressRecorder(ProgressRecorder):
-    def __init__(self, celery_task, db_task: Task, db_alias="default"):
+    """
+    Records the progress of a task in its database and in the Celery result backend, at most
+    once per PROGRESS_SAVE_INTERVAL_MS unless it advanced by PROGRESS_SAVE_PERCENT since the last
+    write, and always when it is complete. The progress of resumable tasks is saved as their checkpoint,
+    with the size of their `output` file (anything with a `tell()`) at that point.
+    """
+    def __init__(self, celery_task, db_task: Task, db_alias="default", resumable=False, output=None):
         self.db_alias = db_alias
         self.db_task = db_task
+        self.resumable = resumable
+        self.output = output
+        self.saved_on = None
+        self.saved_percent = None
         super().__init__(celery_task)
         
     def set_progress(self, current, total, description=""):
         self.db_task.current = current
         self.db_task.total = total 
-        self.db_task.save(using=self.db_alias)
+        if self.is_due():
+            return self.flush(description)
+
+    def is_due(self):
+        if self.saved_on is None or self.db_task.current >= self.db_task.total:
+            return True
+        elapsed = (time.monotonic() - self.saved_on) * 1000
+        advanced = 100 * (self.db_task.percent - self.saved_percent)
+        return elapsed >= settings.PROGRESS_SAVE_INTERVAL_MS or advanced >= settings.PROGRESS_SAVE_PERCENT
+
+    def flush(self, description=""):
+        # Only the progress columns, the other ones are saved by the task itself
+        self.db_task.updated_on = tz.now()
+        update_fields = ['current', 'total', 'updated_on']
+        if self.resumable:
+            self.db_task.checkpoint = self.db_task.current
+            update_fields.append('checkpoint')
+        if self.resumable and self.output is not None:
+            self.db_task.checkpoint_offset = self.output.tell()
+            update_fields.append('checkpoint_offset')
+        # Written unless the task was revoked (or deleted) meanwhile, which the same query tells
+        tasks = Task.objects.using(self.db_alias).filter(pk=self.db_task.pk).exclude(status=Task.Status.REVOKED)
+        if not tasks.update(**{field: getattr(self.db_task, field) for field in update_fields}):
+            stop_task(self.task)
+        # As save() would, for the progress cache and the stamps
+        post_save.send(
+            sender=Task, instance=self.db_task, created=False, update_fields=frozenset(update_fields), raw=False,
+            using=self.db_alias
+        )
+        self.saved_on = time.monotonic()
+        self.saved_percent = self.db_task.percent
         detail = description if description else self.db_task.progress_detail
-        return super().set_progress(current, total, detail)
+        return super().set_progress(self.db_task.current, self.db_task.total, detail)
 
 
 def trigger_task(obj, db_alias, task_id):
@@ -25,19 +97,21 @@ def trigger_task(obj, db_alias, task_id):
         db_task = Task.objects.using(db_alias).get(id=task_id)
     except Task.DoesNotExist:
         return f"Task with id '{task_id}' not found in database '{db_alias}'."
+    stop_if_revoked(obj, db_task, db_alias)
 
     # Sync the Celery runtime task ID with the database
     db_task.task_id = obj.request.id 
     db_task.status = Task.Status.RUNNING
     db_task.save(using=db_alias)
     
-    recorder = TaskProgressRecorder(celery_task=obj, db_task=db_task, db_alias=db_alias)
+    recorder = TaskProgressRecorder(celery_task=obj, db_task=db_task, db_alias=db_alias, resumable=True)
     
-    # Task logic goes here...
-    for i in range(1, db_task.total+1):
+    # Task logic goes here, from the last checkpoint...
+    for i in range(db_task.checkpoint + 1, db_task.total+1):
         if i % 1000 == 0:
             recorder.set_progress(i, db_task.total)
             
+    stop_if_revoked(obj, db_task, db_alias)
     db_task.status = Task.Status.COMPLETED
     db_task.save(using=db_alias)
     recorder.set_progress(db_task.total, db_task.total)
@@ -45,14 +119,122 @@ def trigger_task(obj, db_alias, task_id):
     return f"{db_task.get_type_display()} completed for {db_alias}"
 
 
+def import_shard(obj, db_alias, task_id, segments):
+    try:
+        db_task = Task.objects.using(db_alias).get(id=task_id)
+    except Task.DoesNotExist:
+        return f"Task with id '{task_id}' not found in database '{db_alias}'."
+    stop_if_revoked(obj, db_task, db_alias)
+
+    db_task.task_id = obj.request.id 
+    db_task.status = Task.Status.RUNNING
+    db_task.save(using=db_alias)
+    
+    # The checkpoint counts the rows read (imported or rejected) by the previous runs
+    checkpoint, current = db_task.checkpoint, 0
+    rejected_path = os.path.join(settings.REJECTED_PATH, db_alias, f"{db_task.name}.csv")
+    try:
+        with RejectedRows(path=rejected_path, offset=db_task.checkpoint_offset if checkpoint else 0) as rejected:
+            recorder = TaskProgressRecorder(
+                celery_task=obj, db_task=db_task, db_alias=db_alias, resumable=True, output=rejected
+            )
+            for file_path, start, stop in skip_segments(segments, checkpoint):
+                for chunk in read_products_csv(file_path, start=start, stop=stop, on_reject=rejected):
+                    try:
+                        import_products(chunk, version=db_alias)
+                    except IntegrityError:
+                        # A parallel shard inserted some of these names first, they are updates now
+                        import_products(chunk, version=db_alias)
+                    current += len(chunk)
+                    recorder.set_progress(checkpoint + current + rejected.count, db_task.total)
+    except Ignore:
+        raise
+    except Exception:
+        db_task.status = Task.Status.FAILED
+        db_task.save(using=db_alias)
+        raise
+    
+    stop_if_revoked(obj, db_task, db_alias)
+    db_task.status = Task.Status.COMPLETED
+    db_task.save(using=db_alias)
+    recorder.set_progress(db_task.total, db_task.total)
+    
+    return f"{db_task.get_type_display()} of {current} products ({rejected.count} rejected) completed for {db_alias}"
+
+
+def export_shard(obj, db_alias, task_id, shard, shards, fmt=None):
+    try:
+        db_task = Task.objects.using(db_alias).get(id=task_id)
+    except Task.DoesNotExist:
+        return f"Task with id '{task_id}' not found in database '{db_alias}'."
+    stop_if_revoked(obj, db_task, db_alias)
+
+    # The primary-key range is only known once the import and update steps are done
+    pk_range = get_export_range(db_alias, shard, shards)
+    db_task.task_id = obj.request.id 
+    db_task.status = Task.Status.RUNNING
+    db_task.total = Product.objects.using(db_alias).filter(pk__gte=pk_range[0], pk__lt=pk_range[1]).count()
+    db_task.save(using=db_alias)
+    
+    recorder = TaskProgressRecorder(celery_task=obj, db_task=db_task, db_alias=db_alias)
+    
+    try:
+        count = export_products(
+            db_alias, get_export_path(db_alias, fmt, part=shard), fmt=fmt, pk_range=pk_range, header=(shard == 1),
+            on_progress=lambda current: recorder.set_progress(current, db_task.total)
+        )
+    except Ignore:
+        raise
+    except Exception:
+        db_task.status = Task.Status.FAILED
+        db_task.save(using=db_alias)
+        raise
+    
+    stop_if_revoked(obj, db_task, db_alias)
+    db_task.status = Task.Status.COMPLETED
+    db_task.save(using=db_alias)
+    recorder.set_progress(db_task.total, db_task.total)
+    
+    return f"{db_task.get_type_display()} of {count} products completed for {db_alias}"
+
+
+def assemble_export_task(obj, db_alias, task_id, shards, fmt=None):
+    try:
+        db_task = Task.objects.using(db_alias).get(id=task_id)
+    except Task.DoesNotExist:
+        return f"Task with id '{task_id}' not found in database '{db_alias}'."
+    stop_if_revoked(obj, db_task, db_alias)
+
+    db_task.task_id = obj.request.id 
+    db_task.status = Task.Status.RUNNING
+    db_task.save(using=db_alias)
+    
+    recorder = TaskProgressRecorder(celery_task=obj, db_task=db_task, db_alias=db_alias)
+    try:
+        file_path = assemble_export(db_alias, fmt=fmt, parts=shards)
+    except Exception:
+        db_task.status = Task.Status.FAILED
+        db_task.save(using=db_alias)
+        raise
+    
+    stop_if_revoked(obj, db_task, db_alias)
+    db_task.status = Task.Status.COMPLETED
+    db_task.save(using=db_alias)
+    recorder.set_progress(db_task.total, db_task.total)
+    
+    return f"Export of {db_alias} assembled in '{file_path}'"
+
+
 @shared_task(bind=True) # First-Task in chain
 def trigger_preprocess_task(self, db_alias, task_id):
     return trigger_task(self, db_alias, task_id)
 
 
 @shared_task(bind=True)
-def trigger_import_task(self, res, db_alias, task_id):
-    return trigger_task(self, db_alias, task_id)
+def trigger_import_task(self, res, db_alias, task_id, segments=None):
+    if segments is None:
+        return trigger_task(self, db_alias, task_id)
+    return import_shard(self, db_alias, task_id, segments)
 
 
 @shared_task(bind=True)
@@ -61,99 +243,214 @@ def trigger_update_task(self, res, db_alias, task_id):
 
 
 @shared_task(bind=True)
-def trigger_export_task(self, res, db_alias, task_id):
-    return trigger_task(self, db_alias, task_id)
+def trigger_export_task(self, res, db_alias, task_id, shard=None, shards=None, fmt=None):
+    if shard is None:
+        return trigger_task(self, db_alias, task_id)
+    return export_shard(self, db_alias, task_id, shard, shards, fmt=fmt)
 
 
 @shared_task(bind=True)
-def trigger_postprocess_task(self, res, db_alias, task_id):
-    return trigger_task(self, db_alias, task_id)
+def trigger_postprocess_task(self, res, db_alias, task_id, export_shards=None, fmt=None):
+    if export_shards is None:
+        return trigger_task(self, db_alias, task_id)
+    return assemble_export_task(self, db_alias, task_id, export_shards, fmt=fmt)
 
 
-class ImportWorkflow(Workflow):
+class ImportWorkflow(DagWorkflow):
     
-    def __init__(self, db_alias="default"):
+    def __init__(self, db_alias="default", resume=True):
         super().__init__(db_alias)
+        self.resume = resume
+        self.planned = []
        
     @staticmethod
     def is_triggered(db_alias): 
-        # Check if workflow task is triggered 
+        # The running tasks save their progress regularly: a workflow with pending or running tasks but no task
+        # saved for a while was left by a dead worker
         status_active = [Task.Status.PENDING, Task.Status.RUNNING]
         types_accepted = [Task.Type.DB_IMPORT, Task.Type.DB_UPDATE, Task.Type.DB_EXPORT, Task.Type.DB_PROCESS]
-        return Task.objects.using(db_alias).filter(status__in=status_active, type__in=types_accepted).exists()
-
-    def create_task(self, task_name:str, task_type:Task.Type, total=1):
-        db_task, is_created = Task.objects.using(self.db_alias).update_or_create(
-            name=task_name,
-            type=task_type,
-            defaults={
-                'task_id': None,
-                'database': self.db_alias,
-                'status': Task.Status.PENDING,
-                'triggered_on': tz.now(),
-                'current': 0,
-                'total': total 
-            }
+        tasks = Task.objects.using(db_alias).filter(type__in=types_accepted).aggregate(
+            active=Count('pk', filter=Q(status__in=status_active)), last_saved=Max('updated_on')
         )
-        return db_task
-    
+        updated_after = tz.now() - timedelta(seconds=settings.WORKFLOW_STALE_AFTER)
+        return tasks['active'] > 0 and tasks['last_saved'] >= updated_after
+
+    def lock_tasks(self):
+        """
+        Makes the workflows of the database wait for each other until the end of the transaction. The tasks
+        may not exist yet, so their rows cannot be locked; SQLite serializes the writes already.
+        """
+        connection = connections[self.db_alias]
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_xact_lock(%s)", [WORKFLOW_LOCK_ID])
+
+    def plan_task(self, task_name:str, task_type:Task.Type, total, signature, after=()):
+        # The task is saved with the others in provision_tasks, `signature` makes its Celery signature from its pk
+        self.planned.append((Task(name=task_name, type=task_type, total=total), signature, after))
+        return task_name
+
+    def provision_tasks(self):
+        """
+        Saves the planned tasks (new, or reset to pending) and removes the tasks of the workflow it no longer
+        plans, in one transaction and a constant number of queries. Returns the tasks by (name, type), or None
+        when the workflow is already running (checked under the lock). A finished workflow starts over. An
+        unfinished one resumes: its completed tasks are kept, and the others restart from their checkpoint
+        unless their work changed.
+        """
+        now = tz.now()
+        planned = [db_task for db_task, _, _ in self.planned]
+        keys = {(db_task.name, db_task.type) for db_task in planned}
+        types = {db_task.type for db_task in planned}
+        with transaction.atomic(using=self.db_alias):
+            self.lock_tasks()
+            if self.is_triggered(self.db_alias):
+                return None
+            tasks = Task.objects.using(self.db_alias).select_for_update().filter(type__in=types)
+            existing = {(db_task.name, db_task.type): db_task for db_task in tasks}
+            resume = self.resume and any(
+                db_task.status != Task.Status.COMPLETED for key, db_task in existing.items() if key in keys
+            )
+            to_update, to_create, completed = [], [], []
+            for db_task in planned:
+                current = existing.get((db_task.name, db_task.type))
+                if current is None:
+                    to_create.append(db_task)
+                elif resume and current.status == Task.Status.COMPLETED:
+                    completed.append(current)
+                else:
+                    if not resume or current.total != db_task.total:
+                        current.total = db_task.total
+                        current.checkpoint = current.checkpoint_offset = 0
+                    to_update.append(current)
+            for db_task in to_update + to_create:
+                db_task.task_id = None
+                db_task.database = self.db_alias
+                db_task.status = Task.Status.PENDING
+                db_task.triggered_on = now
+                db_task.updated_on = now
+                db_task.current = db_task.checkpoint
+            Task.objects.using(self.db_alias).bulk_update(
+                to_update,
+                ['task_id', 'database', 'status', 'triggered_on', 'updated_on', 'current', 'checkpoint', 'checkpoint_offset',
+                 'total']
+            )
+            Task.objects.using(self.db_alias).bulk_create(to_create)
+            stale = [db_task.pk for key, db_task in existing.items() if key not in keys]
+            if stale:
+                Task.objects.using(self.db_alias).filter(pk__in=stale).delete()
+            if any(db_task.pk is None for db_task in to_create):
+                # Only some backends return the primary keys of bulk inserts
+                names = [db_task.name for db_task in to_create]
+                to_create = Task.objects.using(self.db_alias).filter(type__in=types, name__in=names)
+            # Bulk saves send no signals
+            saved = to_update + list(to_create)
+            transaction.on_commit(lambda: publish_tasks(saved, self.db_alias), using=self.db_alias)
+            transaction.on_commit(lambda: bump_stamp(self.db_alias, TASKS), using=self.db_alias)
+        return {(db_task.name, db_task.type): db_task for db_task in completed + to_update + list(to_create)}
+
     def _setup_preprocess_step(self):
         task_type = Task.Type.DB_PROCESS
-        pre_process_step = WorkflowStep(name="Pre-Process Step")
-        db_task = self.create_task(task_name="Pre-Process", task_type=task_type, total=10000)
-        pre_process_step.add_task(task=db_task, func=trigger_preprocess_task.s(self.db_alias, db_task.pk))
-        self.add_step(pre_process_step)        
+        return [self.plan_task("Pre-Process", task_type, 10000, lambda pk: trigger_preprocess_task.si(self.db_alias, pk))]
+
+    def get_import_files(self):
+        import_folder = os.path.join(settings.IMPORT_PATH, self.db_alias)
+        if not os.path.isdir(import_folder):
+            return []
+        return sorted(os.path.join(import_folder, file) for file in os.listdir(import_folder) if file.endswith('.csv'))
 
-    def _setup_import_step(self):
+    def _setup_import_step(self, after):
+        # The shards run in parallel, the tasks of shards that no longer exist are dropped
         task_type = Task.Type.DB_IMPORT
-        import_step = WorkflowStep(name="Import Step", parallel=True)
-        for i in range(1, 4):
-            db_task = self.create_task(task_name=f"{task_type}_{i}", task_type=task_type, total=500000)
-            import_step.add_task(task=db_task, func=trigger_import_task.s(self.db_alias, db_task.pk))
-        self.add_step(import_step)
-        
-    def _setup_update_step(self):
+        shards = plan_import_shards(self.get_import_files(), settings.IMPORT_SHARDS)
+        task_names = []
+        for i, segments in enumerate(shards, 1):
+            total = sum(stop - start for _, start, stop in segments)
+            task_names.append(self.plan_task(
+                f"{task_type}_{i}", task_type, total,
+                lambda pk, segments=segments: trigger_import_task.si(None, self.db_alias, pk, segments),
+                after=after
+            ))
+        return task_names or after
+
+    def _setup_update_step(self, after):
+        # One update per import shard, each starting as soon as its own shard is imported
         task_type = Task.Type.DB_UPDATE
-        update_step = WorkflowStep(name="Update Step", parallel=False)
-        for i in range(1, 4):
-            db_task = self.create_task(task_name=f"{task_type}_{i}", task_type=task_type, total=500000)
-            update_step.add_task(task=db_task, func=trigger_update_task.s(self.db_alias, db_task.pk))
-        self.add_step(update_step)
-        
-    def _setup_export_step(self):
+        return [
+            self.plan_task(
+                f"{task_type}_{i}", task_type, 500000,
+                lambda pk: trigger_update_task.si(None, self.db_alias, pk),
+                after=[task_name]
+            )
+            for i, task_name in enumerate(after, 1)
+        ]
+
+    def _setup_export_step(self, after):
+        # The shards run in parallel. Their primary-key ranges span the products of every import shard, so
+        # each waits for all the updates
         task_type = Task.Type.DB_EXPORT
-        export_step = WorkflowStep(name="Export Step", parallel=True)
-        for i in range(1, 4):
-            db_task = self.create_task(task_name=f"{task_type}_{i}", task_type=task_type, total=200000)
-            export_step.add_task(task=db_task, func=trigger_export_task.s(self.db_alias, db_task.pk))
-        self.add_step(export_step)        
-        
-    def _setup_postprocess_step(self):
+        shards = settings.EXPORT_SHARDS
+        task_names = []
+        for i in range(1, shards + 1):
+            # The totals are set when the tasks run, once the products are known
+            task_names.append(self.plan_task(
+                f"{task_type}_{i}", task_type, 0,
+                lambda pk, i=i: trigger_export_task.si(None, self.db_alias, pk, i, shards, settings.EXPORT_FORMAT),
+                after=after
+            ))
+        return task_names or after
+
+    def _setup_postprocess_step(self, after):
         task_type = Task.Type.DB_PROCESS
-        post_process_step = WorkflowStep(name="Post-Process Step")
-        db_task = self.create_task(task_name="Post-Process", task_type=task_type, total=5000)
-        post_process_step.add_task(task=db_task, func=trigger_postprocess_task.s(self.db_alias, db_task.pk))
-        self.add_step(post_process_step)        
-    
+        return [self.plan_task(
+            "Post-Process", task_type, 1,
+            lambda pk: trigger_postprocess_task.si(None, self.db_alias, pk, settings.EXPORT_SHARDS, settings.EXPORT_FORMAT),
+            after=after
+        )]
+
     def setup(self):
-        self._setup_preprocess_step()
-        self._setup_import_step()
-        self._setup_update_step()
-        self._setup_export_step()
-        self._setup_postprocess_step()
-        
+        # Each step returns the tasks the next step waits for. Returns False when the workflow is already running
+        self.planned = []
+        after = self._setup_preprocess_step()
+        after = self._setup_import_step(after)
+        after = self._setup_update_step(after)
+        after = self._setup_export_step(after)
+        self._setup_postprocess_step(after)
+        tasks = self.provision_tasks()
+        if tasks is None:
+            return False
+        for db_task, signature, after in self.planned:
+            db_task = tasks[(db_task.name, db_task.type)]
+            # Completed tasks of a resumed workflow are not run again
+            func = None if db_task.status == Task.Status.COMPLETED else signature(db_task.pk)
+            self.add_task(task=db_task, func=func, after=after)
+        return True
+
 
 @shared_task(bind=True)
-def run_workflow(self, db_alias):
+def run_workflow(self, db_alias, resume=True):
     if ImportWorkflow.is_triggered(db_alias):
-        return
-    workflow = ImportWorkflow(db_alias=db_alias)
-    workflow.setup()
+        return f"Workflow of {db_alias} is already running"
+    workflow = ImportWorkflow(db_alias=db_alias, resume=resume)
+    # Checked again while provisioning, as another trigger may have started it meanwhile
+    if not workflow.setup():
+        return f"Workflow of {db_alias} is already running"
     workflow.run()
-    
-        
+    path, length = workflow.critical_path()
+    return f"Workflow of {db_alias} started, critical path: {' > '.join(path)} ({length} iterations)"
+
+
+def start_all_workflows():
+    """
+    Sets up and starts the workflow of every database version on the workers, in parallel. Returns the
+    saved group result (the batch), whose id can be restored to follow the setup.
+    """
+    databases = [db_alias for db_alias in settings.DATABASES if db_alias != "default"]
+    batch = group([run_workflow.s(db_alias) for db_alias in databases]).apply_async()
+    batch.save()
+    return batch
+
+
 @shared_task(bind=True)
 def run_all_workflows(self):
-    databases = [db_alias for db_alias in settings.DATABASES if db_alias != "default"]
-    for db_alias in databases:
-        run_workflow(db_alias) 
+    return start_all_workflows().id
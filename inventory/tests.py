@@ -1,3 +1,846 @@
-from django.test import TestCase
+import os
+import gzip
+import json
+import asyncio
+import shutil
+import tempfile
+import redis
+from unittest import mock, skipUnless
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+from datetime import timedelta
+from celery import chord, group, signature
+from celery.exceptions import Ignore
+from celery.canvas import _chain
+from decimal import Decimal
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import DatabaseError, connection, transaction
+from django.db.models import F
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django_celery_results.models import TaskResult
+from django.utils import timezone as tz
+from inventory import async_views, catalog, views
+from inventory.diff import DiffResult, DiffRow, diff_products, iter_products_by_name
+from inventory.models import CatalogGeneration, ImportedFile, Product, Task
+from inventory.stamps import PRODUCTS, bump_stamp, get_generation
+from inventory.tasks import ImportWorkflow, TaskProgressRecorder, start_all_workflows, trigger_task
+from inventory.views import get_page_url, get_progress_update
+from inventory.utils import (
+    RejectedRows, WorkflowProgress, assemble_export, check_import_manifest, count_csv_rows, delete_products,
+    export_products, get_export_path, get_export_range, get_products_page, get_task_totals, import_products,
+    import_products_copy, import_products_stream, plan_import_shards, product_row_hash, read_products_csv,
+    search_products, update_import_manifest
+)
+from inventory.workflows import DagWorkflow
 
-# Create your tests here.
+
+class TempDirMixin:
+    def setUp(self):
+        super().setUp()
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir)
+
+    def write_file(self, name, content):
+        path = os.path.join(self.temp_dir, name)
+        with open(path, 'w', newline='', encoding='utf-8') as file:
+            file.write(content)
+        return path
+
+
+class ImportShardsTests(TempDirMixin, SimpleTestCase):
+    def write_csv(self, name, rows, blank_every=0):
+        lines = ["name,price,stock,category"]
+        for i in range(rows):
+            lines.append(f"{name}{i},{i}.50,{i},cat")
+            if blank_every and i % blank_every == 0:
+                lines.append("")
+        return self.write_file(f"{name}.csv", "\n".join(lines) + "\n")
+
+    def read_names(self, segments):
+        names = []
+        for file_path, start, stop in segments:
+            for chunk in read_products_csv(file_path, chunk_size=4, start=start, stop=stop):
+                names.extend(product['name'] for product in chunk)
+        return names
+
+    def test_count_skips_blank_lines(self):
+        self.assertEqual(count_csv_rows(self.write_csv('a', 10, blank_every=3)), 10)
+        self.assertEqual(count_csv_rows(self.write_file('empty.csv', "")), 0)
+
+    def test_shards_cover_every_row_once(self):
+        files = [self.write_csv('a', 10, blank_every=3), self.write_csv('b', 7), self.write_csv('c', 5, blank_every=1)]
+        plan = plan_import_shards(files, 4)
+        self.assertEqual(len(plan), 4)
+        names = [name for shard in plan for name in self.read_names(shard)]
+        expected = [f"a{i}" for i in range(10)] + [f"b{i}" for i in range(7)] + [f"c{i}" for i in range(5)]
+        self.assertEqual(names, expected)
+
+
+class ImportProductsTests(TestCase):
+    databases = {'default'}
+
+    def rows(self, *products):
+        return [{'name': name, 'price': price, 'stock': stock, 'category': 'cat'} for name, price, stock in products]
+
+    def assertCounts(self, result, inserted=0, updated=0, unchanged=0):
+        self.assertEqual((result.inserted, result.updated, result.unchanged), (inserted, updated, unchanged))
+
+    def test_inserted_updated_unchanged(self):
+        result = import_products(self.rows(('a', '1.00', 1), ('b', '2.00', 2), ('c', '3.00', 3)), batch_size=2)
+        self.assertCounts(result, inserted=3)
+        result = import_products(self.rows(('a', '1.00', 1), ('b', '2.50', 2), ('d', '4.00', 4)), batch_size=2)
+        self.assertCounts(result, inserted=1, updated=1, unchanged=1)
+        self.assertEqual(Product.objects.count(), 4)
+        self.assertEqual(Product.objects.get(name='b').price, Decimal('2.50'))
+
+    def test_last_row_wins_for_duplicate_names(self):
+        result = import_products(self.rows(('a', '1.00', 1), ('a', '5.00', 5)))
+        self.assertCounts(result, inserted=1)
+        self.assertEqual(Product.objects.get(name='a').stock, 5)
+
+
+class ImportEnginesTests(TempDirMixin, TestCase):
+    databases = {'default'}
+
+    def read_products(self):
+        return list(Product.objects.order_by('name').values_list('name', 'price', 'stock', 'category', 'row_hash'))
+
+    def test_copy_engine_imports_as_the_batch_engine(self):
+        # Empty categories, exponents, short rows and a column named as the staging row numbers
+        path = self.write_file(
+            'a.csv',
+            "name,price,stock,category,line\na,1e3,1,,x\nb,2.5,2,cat,x\nc,3\n,1,1,x,x\nd,1x,1,x,x\nb,2.25,3,cat,x\n"
+        )
+        batch = RejectedRows()
+        result = import_products([p for chunk in read_products_csv(path, on_reject=batch) for p in chunk])
+        self.assertEqual((result.inserted, batch.count), (2, 3))
+        products = self.read_products()
+        self.assertEqual(products[0][:4], ('a', Decimal('1000.00'), 1, ''))
+        self.assertEqual(products[1][:4], ('b', Decimal('2.25'), 3, 'cat'))
+
+        Product.objects.all().delete()
+        copy = RejectedRows()
+        result = import_products_copy(path, on_reject=copy)
+        self.assertEqual((result.inserted, result.rejected, copy.count), (2, 3, 3))
+        self.assertEqual(self.read_products(), products)
+        self.assertEqual(import_products_copy(path).unchanged, 2)
+
+
+class StreamImportTests(TempDirMixin, TransactionTestCase):
+    # The chunks are written by another thread, which only sees committed data
+    databases = {'default'}
+
+    def test_chunks_are_written_as_they_are_read(self):
+        rows = "".join(f"p{i},{i}.5,{i},x\n" for i in range(7)) + "bad,oops,1,x\np0,9,9,y\n"
+        path = self.write_file('a.csv', "name,price,stock,category\n" + rows)
+        with RejectedRows() as rejected:
+            result = import_products_stream(read_products_csv(path, chunk_size=2, on_reject=rejected), batch_size=2)
+        self.assertEqual((result.inserted, result.updated, result.unchanged, rejected.count), (7, 1, 0, 1))
+        self.assertEqual(Product.objects.count(), 7)
+        self.assertEqual(Product.objects.get(name='p0').price, Decimal('9.00'))
+
+        # The chunks are written in order, so p0 is set back by the first chunk and again by the last one
+        result = import_products_stream(read_products_csv(path, chunk_size=3))
+        self.assertEqual((result.inserted, result.updated, result.unchanged), (0, 2, 6))
+        self.assertEqual(Product.objects.get(name='p0').price, Decimal('9.00'))
+
+
+VERSIONS = [db_alias for db_alias in settings.DATABASES if db_alias != 'default'][:2]
+
+
+@skipUnless(len(VERSIONS) == 2, "Needs two database versions")
+@mock.patch('inventory.management.commands.import_products.ProcessPoolExecutor', ThreadPoolExecutor)
+class ParallelImportTests(TempDirMixin, TransactionTestCase):
+    # The versions are imported by threads rather than processes, which would not share the in-memory test databases
+    databases = {'default', *VERSIONS}
+
+    def setUp(self):
+        super().setUp()
+        settings = override_settings(IMPORT_PATH=self.temp_dir, REJECTED_PATH=os.path.join(self.temp_dir, 'rejected'))
+        settings.enable()
+        self.addCleanup(settings.disable)
+        for i, db_alias in enumerate(VERSIONS, 1):
+            os.makedirs(os.path.join(self.temp_dir, db_alias))
+            rows = "".join(f"{db_alias}-{j},1,{j},x\n" for j in range(i * 3)) + "bad,1,oops,x\n"
+            self.write_file(os.path.join(db_alias, 'a.csv'), "name,price,stock,category\n" + rows)
+            self.write_file(os.path.join(db_alias, 'b.csv'), "name,price,stock\nshared,2,2\n")
+
+    def import_products(self, *args):
+        out = StringIO()
+        call_command('import_products', '--jobs', '2', *args, stdout=out, stderr=StringIO())
+        return out.getvalue()
+
+    def test_versions_are_imported_in_parallel(self):
+        output = self.import_products('--engine', 'stream', '--chunk-size', '2')
+        for i, db_alias in enumerate(VERSIONS, 1):
+            self.assertEqual(Product.objects.using(db_alias).count(), i * 3 + 1)
+            self.assertIn(f"- {db_alias}: {i * 3 + 1} inserted, 0 updated, 0 unchanged, 1 rejected", output)
+            with open(os.path.join(self.temp_dir, 'rejected', db_alias, 'a.csv'), encoding='utf-8') as file:
+                self.assertEqual(file.read().splitlines()[1:], [f"{i * 3 + 1},Invalid stock 'oops',bad,1,oops,x"])
+
+        # The files are unchanged since their import
+        output = self.import_products()
+        for db_alias in VERSIONS:
+            self.assertIn(f"- {db_alias}: 0 inserted, 0 updated, 0 unchanged, 0 rejected, 2 files unchanged", output)
+
+
+class IncrementalImportTests(TempDirMixin, TestCase):
+    databases = {'default'}
+
+    def test_row_hash_is_stored(self):
+        import_products([{'name': 'a', 'price': '1.5', 'stock': 2, 'category': 'x'}])
+        product = Product.objects.get(name='a')
+        self.assertEqual(product.row_hash, product_row_hash(product))
+
+    def test_rows_edited_through_the_orm_are_corrected(self):
+        rows = [{'name': 'a', 'price': '1.5', 'stock': 2, 'category': 'x'}, {'name': 'b', 'price': '1', 'stock': 1}]
+        import_products(rows)
+        product = Product.objects.get(name='a')
+        product.price = 5
+        product.save()
+        product = Product.objects.get(name='b')
+        product.stock = 3
+        product.save(update_fields=['stock'])
+
+        result = import_products(rows)
+        self.assertEqual((result.updated, result.unchanged), (2, 0))
+        self.assertEqual(Product.objects.get(name='a').price, Decimal('1.50'))
+        self.assertEqual(Product.objects.get(name='b').stock, 1)
+        self.assertEqual(import_products(rows).unchanged, 2)
+
+    def test_manifest_detects_changed_files(self):
+        path = self.write_file('a.csv', "name,price,stock\na,1,1\n")
+        is_unchanged, fingerprint = check_import_manifest(path, 'default')
+        self.assertFalse(is_unchanged)
+        update_import_manifest(path, 'default', fingerprint, rows=1)
+        self.assertTrue(check_import_manifest(path, 'default')[0])
+
+        # Touched but not modified
+        os.utime(path, (0, 0))
+        self.assertTrue(check_import_manifest(path, 'default')[0])
+        self.assertEqual(ImportedFile.objects.get(name='a.csv').mtime, 0)
+
+        self.write_file('a.csv', "name,price,stock\na,2,1\n")
+        self.assertFalse(check_import_manifest(path, 'default')[0])
+
+
+class RejectedRowsTests(TempDirMixin, SimpleTestCase):
+    def test_invalid_rows_are_written_with_their_reason(self):
+        path = self.write_file('a.csv', "name,price,stock,category\na,1,1,x\nb,oops,1,x\n,1,1,x\nc,1,1.5,x\nd,2,2,x\n")
+        rejected_path = os.path.join(self.temp_dir, 'rejected', 'a.csv')
+        with RejectedRows(path=rejected_path) as rejected:
+            products = [p for chunk in read_products_csv(path, chunk_size=2, on_reject=rejected) for p in chunk]
+        self.assertEqual([product['name'] for product in products], ['a', 'd'])
+        self.assertEqual(rejected.count, 3)
+        with open(rejected_path, newline='', encoding='utf-8') as file:
+            lines = file.read().splitlines()
+        self.assertEqual(lines[0], "row,reason,name,price,stock,category")
+        self.assertEqual(
+            [line.split(',')[:2] for line in lines[1:]],
+            [['2', "Invalid price 'oops'"], ['3', 'Missing name'], ['4', "Invalid stock '1.5'"]]
+        )
+
+    def test_resumed_rejections_restart_from_the_checkpoint(self):
+        path = self.write_file('a.csv', "name,price,stock,category\na,oops,1,x\nb,oops,1,x\n")
+        rejected_path = os.path.join(self.temp_dir, 'rejected', 'a.csv')
+        with RejectedRows(path=rejected_path) as rejected:
+            chunks = read_products_csv(path, chunk_size=1, on_reject=rejected)
+            next(chunks, None)
+            offset = rejected.tell()
+            list(chunks)
+        # The second row is read again after a crash at the first checkpoint
+        with RejectedRows(path=rejected_path, offset=offset) as rejected:
+            list(read_products_csv(path, chunk_size=1, start=1, on_reject=rejected))
+        with open(rejected_path, newline='', encoding='utf-8') as file:
+            self.assertEqual([line.split(',')[0] for line in file.read().splitlines()], ['row', '1', '2'])
+
+    def test_previous_rejections_are_replaced(self):
+        rejected_path = self.write_file('rejected.csv', "stale\n")
+        with RejectedRows(path=rejected_path):
+            pass
+        self.assertFalse(os.path.exists(rejected_path))
+
+
+class CatalogCacheTests(TestCase):
+    databases = {'default'}
+
+    def setUp(self):
+        caches['catalog'].clear()
+
+    def test_imports_change_the_generation(self):
+        generation = get_generation('default')
+        import_products([{'name': 'a', 'price': '1', 'stock': 1}])
+        self.assertNotEqual(get_generation('default'), generation)
+        generation = get_generation('default')
+        import_products([{'name': 'a', 'price': '1', 'stock': 1}])
+        self.assertEqual(get_generation('default'), generation)
+
+    def test_deleted_products_change_the_generation(self):
+        import_products([{'name': name, 'price': '1', 'stock': 1} for name in ('a', 'b')])
+        generation = get_generation('default')
+        Product.objects.get(name='a').delete()
+        self.assertNotEqual(get_generation('default'), generation)
+        generation = get_generation('default')
+        self.assertEqual(delete_products('default'), 1)
+        self.assertNotEqual(get_generation('default'), generation)
+
+    def test_stamps_not_bumped_are_removed(self):
+        client = mock.MagicMock()
+        client.pipeline.return_value.__enter__.return_value.execute.side_effect = redis.RedisError("down")
+        with mock.patch('inventory.stamps.get_client', return_value=client), self.assertLogs('inventory.stamps'):
+            bump_stamp('default', PRODUCTS)
+        client.hdel.assert_called_once_with(settings.STAMPS_REDIS_KEY, 'default:products:n', 'default:products:t')
+
+    def test_changes_made_by_other_processes_are_seen(self):
+        import_products([{'name': 'a', 'price': '1', 'stock': 1}])
+        self.assertEqual(catalog.count_products('default'), 1)
+        with self.assertNumQueries(1):
+            self.assertEqual(catalog.count_products('default'), 1)
+
+        # As written by a worker, which does not share the cache of this process
+        Product.objects.bulk_create([Product(name='b', price=1, stock=1)])
+        CatalogGeneration.objects.filter(pk=1).update(value=F('value') + 1)
+        self.assertEqual(catalog.count_products('default'), 2)
+
+
+@mock.patch('inventory.views.get_active_databases', return_value=['default'])
+class ExportTests(TempDirMixin, TestCase):
+    databases = {'default'}
+
+    def setUp(self):
+        super().setUp()
+        settings = override_settings(EXPORT_PATH=self.temp_dir, EXPORT_ACCEL_REDIRECT_URL='')
+        settings.enable()
+        self.addCleanup(settings.disable)
+        import_products([{'name': 'a', 'price': '1', 'stock': 1}])
+
+    def export_part(self, part, parts):
+        pk_range = get_export_range('default', part, parts)
+        export_products('default', get_export_path('default', 'csv', part=part), 'csv', pk_range, header=(part == 1))
+
+    def test_etag_follows_the_products(self, active_databases):
+        response = self.client.get('/export/default.csv')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content).decode().splitlines()[1:], ['a,1.00,1,Unknown'])
+        etag = response['ETag']
+        self.assertEqual(self.client.get('/export/default.csv', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertNotEqual(self.client.get('/export/default.csv.gz')['ETag'], etag)
+
+        import_products([{'name': 'a', 'price': '2', 'stock': 1}])
+        self.assertEqual(self.client.get('/export/default.csv', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_precomputed_export_is_used_until_the_products_change(self, active_databases):
+        file_path = get_export_path('default', 'csv')
+        os.makedirs(os.path.dirname(file_path))
+        with open(file_path, 'wb') as file:
+            file.write(b'precomputed')
+        response = self.client.get('/export/default.csv.gz')
+        self.assertEqual(b''.join(response.streaming_content), b'precomputed')
+
+        os.utime(file_path, (0, 0))
+        response = self.client.get('/export/default.csv.gz')
+        self.assertNotEqual(b''.join(response.streaming_content), b'precomputed')
+
+    def test_exports_with_missing_parts_are_not_assembled(self, active_databases):
+        import_products([{'name': 'b', 'price': '2', 'stock': 2}])
+        for part in (1, 2):
+            self.export_part(part, 2)
+        os.remove(get_export_path('default', 'csv', part=2))
+        with self.assertRaisesMessage(FileNotFoundError, 'products.part2.csv.gz'):
+            assemble_export('default', fmt='csv', parts=2)
+        self.assertFalse(os.path.exists(get_export_path('default', 'csv')))
+        self.assertTrue(os.path.exists(get_export_path('default', 'csv', part=1)))
+
+        self.export_part(2, 2)
+        file_path = assemble_export('default', fmt='csv', parts=2)
+        with gzip.open(file_path, 'rt') as file:
+            lines = file.read().splitlines()
+        self.assertEqual(lines, ['name,price,stock,category', 'a,1.00,1,Unknown', 'b,2.00,2,Unknown'])
+        self.assertFalse(os.path.exists(get_export_path('default', 'csv', part=1)))
+
+
+@mock.patch('inventory.progress.publish_tasks')
+class ProgressPublishTests(TestCase):
+    databases = {'default'}
+
+    def test_progress_is_published_once_committed(self, publish_tasks):
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                task = Task.objects.create(name='a', total=10)
+                task.current = 5
+                task.save()
+                publish_tasks.assert_not_called()
+        self.assertEqual([call.args[0][0].current for call in publish_tasks.call_args_list], [0, 5])
+
+    def test_rolled_back_progress_is_not_published(self, publish_tasks):
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(DatabaseError):
+                with transaction.atomic():
+                    Task.objects.create(name='a', total=10)
+                    raise DatabaseError
+        publish_tasks.assert_not_called()
+
+
+@mock.patch('inventory.views.get_active_databases', return_value=['default'])
+class ProgressUpdateTests(TestCase):
+    databases = {'default'}
+
+    def test_only_changes_are_sent(self, active_databases):
+        first = Task.objects.create(name='a', total=10)
+        second = Task.objects.create(name='b', total=10)
+        token, update = get_progress_update()
+        self.assertTrue(update['full'])
+        self.assertEqual(set(update['tasks']), {f"default-{first.pk}", f"default-{second.pk}"})
+        self.assertEqual(get_progress_update(token), (token, None))
+
+        first.status, first.current = Task.Status.RUNNING, 5
+        first.save()
+        removed = f"default-{second.pk}"
+        second.delete()
+        token, update = get_progress_update(token)
+        self.assertFalse(update['full'])
+        self.assertEqual(list(update['tasks']), [f"default-{first.pk}"])
+        self.assertEqual(update['removed']['tasks'], [removed])
+
+    @mock.patch('inventory.views.get_stamp_validators', return_value=('"stamp"', 0))
+    def test_nothing_is_read_while_the_tasks_stamp_is_unchanged(self, stamp_validators, active_databases):
+        Task.objects.create(name='a', total=10)
+        token, update = get_progress_update()
+        self.assertEqual(token, 'stamp')
+        with self.assertNumQueries(0):
+            self.assertEqual(get_progress_update(token), (token, None))
+
+
+@mock.patch('inventory.views.get_active_databases', return_value=['default', 'missing'])
+class TasksProgressTests(TestCase):
+    databases = {'default'}
+
+    def test_unavailable_databases_are_reported(self, active_databases):
+        task = Task.objects.create(name='a', total=10, status=Task.Status.COMPLETED)
+        response = self.client.get('/task-progress/', {'task': [f'default:{task.pk}', 'missing:1']})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['unavailable'], ['missing'])
+        self.assertEqual(data['tasks'][f'default-{task.pk}']['state'], 'SUCCESS')
+
+    def test_revoked_tasks_are_not_failures(self, active_databases):
+        stopped = Task.objects.create(name='a', total=10, status=Task.Status.REVOKED, task_id='stopped')
+        running = Task.objects.create(name='b', total=10, status=Task.Status.RUNNING, task_id='running')
+        TaskResult.objects.create(task_id='stopped', status='REVOKED')
+        TaskResult.objects.create(task_id='running', status='REVOKED')
+        tasks = self.client.get('/task-progress/').json()['tasks']
+        for task in (stopped, running):
+            self.assertEqual(
+                (tasks[f'default-{task.pk}']['state'], tasks[f'default-{task.pk}']['success']), ('REVOKED', None)
+            )
+        self.assertEqual(self.client.get(f'/task-progress/default/{stopped.pk}/').json()['state'], 'REVOKED')
+
+
+def describe(canvas):
+    # The canvas as nested ['series', ...] and ['parallel', ...] lists of task names
+    if isinstance(canvas, chord):
+        return describe(_chain(group(canvas.tasks), canvas.body))
+    if isinstance(canvas, group):
+        return ['parallel', *(describe(task) for task in canvas.tasks)]
+    if isinstance(canvas, _chain):
+        series = ['series']
+        for task in map(describe, canvas.tasks):
+            series.extend(task[1:] if task[0] == 'series' else [task])
+        return series
+    return canvas.task
+
+
+class DagWorkflowTests(SimpleTestCase):
+    def setUp(self):
+        self.workflow = DagWorkflow('default')
+
+    def add(self, name, total, after=(), done=False):
+        func = None if done else signature(name, immutable=True)
+        return self.workflow.add_task(Task(name=name, total=total), func, after=after)
+
+    def add_shards(self, done=()):
+        # The longest import is on the shard with the shortest update
+        pre = self.add('pre', 1, done='pre' in done)
+        imports = [self.add('import_1', 10, [pre]), self.add('import_2', 1, [pre])]
+        updates = [self.add('update_1', 2, [imports[0]]), self.add('update_2', 10, [imports[1]])]
+        exports = [self.add(f'export_{i}', i, updates) for i in (1, 2)]
+        self.add('post', 1, exports)
+        return [[pre], imports, updates, exports, ['post']]
+
+    def test_dependencies_are_checked(self):
+        self.add('a', 1)
+        with self.assertRaises(ValueError):
+            self.add('b', 1, after=['c'])
+        with self.assertRaises(ValueError):
+            self.add('a', 1)
+
+    def test_independent_tasks_run_in_parallel(self):
+        self.add_shards()
+        self.assertEqual(describe(self.workflow.compile()), [
+            'series', 'pre',
+            ['parallel', ['series', 'import_1', 'update_1'], ['series', 'import_2', 'update_2']],
+            ['parallel', 'export_1', 'export_2'],
+            'post'
+        ])
+
+    def test_critical_path_is_shorter_than_the_stages(self):
+        stages = self.add_shards()
+        path, length = self.workflow.critical_path()
+        self.assertEqual(path, ['pre', 'import_1', 'update_1', 'export_2', 'post'])
+        self.assertEqual(length, 16)
+        stage_lengths = [max(self.workflow.tasks[key].task.total for key in stage) for stage in stages]
+        self.assertLess(length, sum(stage_lengths))
+
+    def test_done_tasks_only_order_the_others(self):
+        self.add_shards(done=('pre',))
+        self.assertEqual(describe(self.workflow.compile())[:2], [
+            'series', ['parallel', ['series', 'import_1', 'update_1'], ['series', 'import_2', 'update_2']]
+        ])
+        path, length = self.workflow.critical_path()
+        self.assertEqual((path[0], length), ('import_1', 15))
+
+
+class ImportWorkflowTests(TempDirMixin, TestCase):
+    databases = {'default'}
+
+    def setUp(self):
+        super().setUp()
+        settings = override_settings(IMPORT_PATH=self.temp_dir, IMPORT_SHARDS=2, EXPORT_SHARDS=2)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        os.makedirs(os.path.join(self.temp_dir, 'default'))
+        rows = "".join(f"p{i},1,1,x\n" for i in range(10))
+        self.write_file(os.path.join('default', 'a.csv'), "name,price,stock,category\n" + rows)
+
+    def test_updates_only_wait_for_their_import_shard(self):
+        workflow = ImportWorkflow('default')
+        workflow.setup()
+        for key, node in workflow.tasks.items():
+            node.func = signature(key, immutable=True)
+        self.assertEqual(describe(workflow.compile()), [
+            'series', 'Pre-Process',
+            ['parallel', ['series', 'DB_IMPORT_1', 'DB_UPDATE_1'], ['series', 'DB_IMPORT_2', 'DB_UPDATE_2']],
+            ['parallel', 'DB_EXPORT_1', 'DB_EXPORT_2'],
+            'Post-Process'
+        ])
+        # Instead of the updates one after the other
+        path, length = workflow.critical_path()
+        self.assertEqual((len(path), path[2]), (5, path[1].replace('IMPORT', 'UPDATE')))
+        self.assertEqual(length, 10000 + 5 + 500000 + 1 + 1)
+
+
+@mock.patch('inventory.progress.publish_task')
+@override_settings(PROGRESS_SAVE_INTERVAL_MS=60000, PROGRESS_SAVE_PERCENT=10)
+class TaskProgressRecorderTests(TestCase):
+    databases = {'default'}
+
+    def setUp(self):
+        self.task = Task.objects.create(name='a', status=Task.Status.RUNNING, total=1000)
+        self.recorder = TaskProgressRecorder(mock.Mock(), self.task, resumable=True)
+
+    def test_progress_writes_are_coalesced(self, publish_task):
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+            for current in range(1, 1001):
+                self.recorder.set_progress(current, 1000)
+        # The first one, one per 10%, and the last one
+        self.assertEqual(len(queries), 11)
+        self.assertEqual(publish_task.call_count, 11)
+        self.task.refresh_from_db()
+        self.assertEqual((self.task.current, self.task.checkpoint), (1000, 1000))
+        self.assertEqual(publish_task.call_args[0][0].current, 1000)
+
+    def test_revoked_tasks_stop_at_their_next_write(self, publish_task):
+        self.recorder.set_progress(1, 1000)
+        Task.objects.filter(pk=self.task.pk).update(status=Task.Status.REVOKED)
+        self.recorder.set_progress(2, 1000)
+        with self.assertRaises(Ignore):
+            self.recorder.set_progress(1000, 1000)
+        self.recorder.task.update_state.assert_called_with(state='REVOKED')
+        self.task.refresh_from_db()
+        self.assertEqual((self.task.status, self.task.current), (Task.Status.REVOKED, 1))
+
+
+class WorkflowStateTests(TestCase):
+    databases = {'default'}
+
+    def add_task(self, name, status, ago=0, **kwargs):
+        task = Task.objects.create(name=name, type=Task.Type.DB_IMPORT, status=status, total=10, **kwargs)
+        Task.objects.filter(pk=task.pk).update(updated_on=tz.now() - timedelta(seconds=ago))
+        return task
+
+    @override_settings(WORKFLOW_STALE_AFTER=60)
+    def test_queued_tasks_of_a_running_workflow_are_not_stale(self):
+        self.add_task('queued', Task.Status.PENDING, ago=3600)
+        running = self.add_task('running', Task.Status.RUNNING)
+        self.assertTrue(ImportWorkflow.is_triggered('default'))
+
+        # Left by a dead worker
+        Task.objects.filter(pk=running.pk).update(updated_on=tz.now() - timedelta(seconds=120))
+        self.assertFalse(ImportWorkflow.is_triggered('default'))
+
+    def test_revoked_tasks_are_not_run(self):
+        task = self.add_task('revoked', Task.Status.REVOKED)
+        celery_task = mock.Mock()
+        with self.assertRaises(Ignore):
+            trigger_task(celery_task, 'default', task.pk)
+        celery_task.update_state.assert_called_once_with(state='REVOKED')
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.current), (Task.Status.REVOKED, 0))
+
+    def test_unfinished_workflows_resume(self):
+        workflow = ImportWorkflow('default')
+        for name in ('a', 'b'):
+            workflow.plan_task(name, Task.Type.DB_IMPORT, 10, None)
+        tasks = workflow.provision_tasks()
+        Task.objects.filter(pk=tasks[('a', Task.Type.DB_IMPORT)].pk).update(status=Task.Status.COMPLETED, current=10)
+        Task.objects.filter(pk=tasks[('b', Task.Type.DB_IMPORT)].pk).update(
+            status=Task.Status.REVOKED, current=6, checkpoint=5, checkpoint_offset=100
+        )
+
+        tasks = workflow.provision_tasks()
+        a, b = tasks[('a', Task.Type.DB_IMPORT)], tasks[('b', Task.Type.DB_IMPORT)]
+        self.assertEqual((a.status, a.current), (Task.Status.COMPLETED, 10))
+        self.assertEqual((b.status, b.current, b.checkpoint, b.checkpoint_offset), (Task.Status.PENDING, 5, 5, 100))
+
+        # Unless their work changed
+        Task.objects.filter(pk=b.pk).update(status=Task.Status.REVOKED)
+        workflow.planned[1][0].total = 20
+        b = workflow.provision_tasks()[('b', Task.Type.DB_IMPORT)]
+        self.assertEqual((b.total, b.current, b.checkpoint, b.checkpoint_offset), (20, 0, 0, 0))
+
+    def test_tasks_no_longer_planned_are_deleted(self):
+        workflow = ImportWorkflow('default')
+        for name in ('a', 'b'):
+            workflow.plan_task(name, Task.Type.DB_IMPORT, 10, None)
+        a = workflow.provision_tasks()[('a', Task.Type.DB_IMPORT)]
+        Task.objects.update(status=Task.Status.COMPLETED)
+
+        workflow = ImportWorkflow('default')
+        workflow.plan_task('a', Task.Type.DB_IMPORT, 10, None)
+        tasks = workflow.provision_tasks()
+        self.assertEqual(list(tasks), [('a', Task.Type.DB_IMPORT)])
+        self.assertEqual(list(Task.objects.values_list('pk', 'name')), [(a.pk, 'a')])
+
+    def test_running_workflows_are_not_provisioned_again(self):
+        workflow = ImportWorkflow('default')
+        workflow.plan_task('a', Task.Type.DB_IMPORT, 10, None)
+        a = workflow.provision_tasks()[('a', Task.Type.DB_IMPORT)]
+        Task.objects.filter(pk=a.pk).update(status=Task.Status.RUNNING, current=5)
+        self.assertIsNone(workflow.provision_tasks())
+        self.assertEqual(Task.objects.get(pk=a.pk).current, 5)
+
+
+class StartWorkflowsTests(TestCase):
+    databases = {'default'}
+
+    @mock.patch('inventory.tasks.group')
+    def test_every_version_is_started_in_one_batch(self, group):
+        batch = start_all_workflows()
+        self.assertEqual(batch, group.return_value.apply_async.return_value)
+        batch.save.assert_called_once_with()
+        versions = [(db_alias,) for db_alias in settings.DATABASES if db_alias != 'default']
+        self.assertTrue(versions)
+        self.assertEqual([task.args for task in group.call_args[0][0]], versions)
+        self.assertEqual({task.task for task in group.call_args[0][0]}, {'inventory.tasks.run_workflow'})
+
+    @mock.patch('inventory.views.start_all_workflows')
+    def test_progress_page_follows_the_batch(self, start_all_workflows):
+        start_all_workflows.return_value.id = 'batch-id'
+        response = self.client.get(reverse('trigger_workflows'))
+        progress_url = f"{reverse('workflow_progress_all')}?batch=batch-id"
+        self.assertRedirects(response, progress_url, fetch_redirect_response=False)
+
+    @mock.patch('inventory.views.GroupResult.restore')
+    def test_batch_status(self, restore):
+        restore.return_value = None
+        self.assertEqual(self.client.get('/workflow-batch/missing/').status_code, 404)
+
+        done, running = mock.Mock(id='a', state='SUCCESS', result='started'), mock.Mock(id='b', state='STARTED')
+        done.ready.return_value, running.ready.return_value = True, False
+        restore.return_value = mock.Mock(id='batch-id', results=[done, running])
+        restore.return_value.completed_count.return_value = 1
+        restore.return_value.ready.return_value = False
+        restore.return_value.failed.return_value = False
+        self.assertEqual(self.client.get('/workflow-batch/batch-id/').json(), {
+            'id': 'batch-id', 'total': 2, 'completed': 1, 'ready': False, 'failed': False,
+            'results': [
+                {'id': 'a', 'state': 'SUCCESS', 'result': 'started'},
+                {'id': 'b', 'state': 'STARTED', 'result': None},
+            ],
+        })
+
+
+class ProductsPageTests(TestCase):
+    databases = {'default'}
+
+    def setUp(self):
+        import_products([{'name': f'p{i}', 'price': '1', 'stock': 1} for i in range(5)])
+        self.ids = list(Product.objects.order_by('id').values_list('id', flat=True))
+
+    def get_page(self, **cursor):
+        page = get_products_page('default', size=2, **cursor)
+        return [product['id'] for product in page['products']], page['previous'], page['next']
+
+    def test_pages_forward_and_back(self):
+        ids = self.ids
+        self.assertEqual(self.get_page(), (ids[0:2], None, ids[1]))
+        self.assertEqual(self.get_page(after=ids[1]), (ids[2:4], ids[2], ids[3]))
+        self.assertEqual(self.get_page(after=ids[3]), (ids[4:5], ids[4], None))
+        self.assertEqual(self.get_page(before=ids[4]), (ids[2:4], ids[2], ids[3]))
+        self.assertEqual(self.get_page(before=ids[2]), (ids[0:2], None, ids[1]))
+
+    def test_page_urls_keep_the_cursors_of_other_versions(self):
+        request = RequestFactory().get('/', {'after_a': 3, 'before_b': 9, 'size': 2})
+        self.assertEqual(get_page_url(request, 'a', 'before', 4), '?before_b=9&size=2&before_a=4')
+        self.assertIsNone(get_page_url(request, 'a', 'after', None))
+
+
+def map_in_thread(func, databases, *args, **kwargs):
+    # The test data is not committed, so it is not seen by the connections of other threads
+    return {db_alias: func(db_alias, *args) for db_alias in databases}
+
+
+@mock.patch('inventory.views.map_databases', map_in_thread)
+@mock.patch('inventory.views.get_active_databases', return_value=['default'])
+class SearchTests(TestCase):
+    databases = {'default'}
+
+    def setUp(self):
+        caches['catalog'].clear()
+        products = (
+            ('pineapple', 'fruit'), ('Apple pie', 'cake'), ('banana', 'fruit'), ('apple', 'fruit'), ('carrot', 'root')
+        )
+        import_products([{'name': name, 'price': '1', 'stock': 1, 'category': category} for name, category in products])
+
+    def test_exact_then_prefix_then_other_matches(self, active_databases):
+        products = search_products('default', 'APPLE', 10)
+        self.assertEqual([product['name'] for product in products], ['apple', 'Apple pie', 'pineapple'])
+        self.assertEqual([product['rank'] for product in products], [1.0, 0.5, 0.0])
+        # Categories match too, names break ties
+        products = search_products('default', 'fruit', 2)
+        self.assertEqual([product['name'] for product in products], ['apple', 'banana'])
+        self.assertEqual(search_products('default', 'kiwi', 10), [])
+
+    @override_settings(SEARCH_PAGE_SIZE=2)
+    def test_results_are_paged(self, active_databases):
+        response = self.client.get('/search/', {'q': 'apple'})
+        self.assertEqual([product['name'] for product in response.context['products']], ['apple', 'Apple pie'])
+        self.assertEqual(response.context['products'][0]['version'], 'default')
+        self.assertEqual((response.context['next_url'], response.context['previous_url']), ('?q=apple&page=2', None))
+        response = self.client.get('/search/', {'q': 'apple', 'page': 2})
+        self.assertEqual([product['name'] for product in response.context['products']], ['pineapple'])
+        self.assertEqual((response.context['next_url'], response.context['previous_url']), (None, '?q=apple&page=1'))
+
+    def test_empty_query_searches_nothing(self, active_databases):
+        with mock.patch('inventory.catalog.search') as search:
+            response = self.client.get('/search/', {'q': '  '})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.context['query'], response.context['products']), ('', []))
+        search.assert_not_called()
+
+
+class WorkflowProgressTests(TestCase):
+    databases = {'default'}
+
+    def test_totals_are_summed_by_the_database(self):
+        for name, status, current, total in (
+            ('a', Task.Status.COMPLETED, 10, 10), ('b', Task.Status.RUNNING, 1, 4), ('c', Task.Status.RUNNING, 3, 4),
+            ('d', Task.Status.PENDING, 0, 0),
+        ):
+            Task.objects.create(name=name, status=status, current=current, total=total)
+        totals = {row['status']: (row['count'], row['current']) for row in get_task_totals('default')}
+        self.assertEqual(totals, {'COMPLETED': (1, 1.0), 'RUNNING': (2, 1.0), 'PENDING': (1, 0.0)})
+
+        from_db, from_tasks = WorkflowProgress(), WorkflowProgress()
+        from_db.update_from_db('default')
+        from_tasks.update(Task.objects.all())
+        self.assertEqual((from_db.total, from_db.percent, from_db.status), (4, 50.0, from_tasks.status))
+        self.assertEqual(from_db.percent, from_tasks.percent)
+        self.assertTrue(from_db.is_active)
+        self.assertFalse(from_db.is_complete)
+
+
+@mock.patch('inventory.async_views.get_active_databases', return_value=['default', 'missing'])
+@mock.patch('inventory.views.get_active_databases', return_value=['default', 'missing'])
+class UnavailableDatabasesTests(TestCase):
+    databases = {'default'}
+
+    def test_sync_and_async_progress_agree(self, active_databases, async_active_databases):
+        request = RequestFactory().get('/overall-progress/')
+        sync_data = json.loads(views.overall_progress(request).content)
+        async_data = json.loads(asyncio.run(async_views.overall_progress(request)).content)
+        self.assertEqual(sync_data, async_data)
+        self.assertEqual(sync_data['unavailable'], ['missing'])
+
+    def test_unavailable_databases_are_shown_without_tasks(self, active_databases, async_active_databases):
+        Task.objects.create(name='a', total=10)
+        request = RequestFactory().get('/workflow-progress/')
+        for view in (views.workflow_progress_all, views.list_all_tasks):
+            response = view(request)
+            self.assertEqual(response.status_code, 200)
+            self.assertIn(b'missing', response.content)
+
+
+@mock.patch('inventory.views.get_active_databases', return_value=['default'])
+@mock.patch('inventory.stamps.get_stamps', return_value={'default': (3, 1000.0)})
+class StampedViewsTests(TestCase):
+    databases = {'default'}
+
+    def test_unchanged_stamps_answer_not_modified(self, stamps, active_databases):
+        response = self.client.get('/overall-progress/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Last-Modified'], 'Thu, 01 Jan 1970 00:16:40 GMT')
+        etag = response['ETag']
+        self.assertEqual(self.client.get('/overall-progress/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # Another URL of the same view has its own ETag
+        self.assertNotEqual(self.client.get('/overall-progress/?all=1')['ETag'], etag)
+
+        stamps.return_value = {'default': (4, 1001.0)}
+        self.assertEqual(self.client.get('/overall-progress/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_async_views_answer_not_modified(self, stamps, active_databases):
+        etag = self.client.get('/overall-progress/')['ETag']
+        request = RequestFactory().get('/overall-progress/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(asyncio.run(async_views.overall_progress(request)).status_code, 304)
+
+    def test_no_validators_without_stamps(self, stamps, active_databases):
+        stamps.return_value = None
+        response = self.client.get('/overall-progress/')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('ETag'))
+
+
+class DiffProductsTests(TestCase):
+    databases = {'default'}
+
+    def diff(self, versions):
+        result = DiffResult()
+        with mock.patch('inventory.diff.iter_products_by_name', lambda db_alias, _: iter(versions[db_alias])):
+            return list(diff_products('old', 'new', result=result)), result
+
+    def test_versions_are_merged_by_name(self):
+        changes, result = self.diff({
+            'old': [DiffRow(name, Decimal('1'), 1, 'x') for name in ('a', 'b', 'c')],
+            'new': [DiffRow(name, Decimal(price), 1, 'x') for name, price in (('b', '2'), ('c', '1'), ('d', '1'))],
+        })
+        self.assertEqual(
+            [(change['change'], change['name']) for change in changes],
+            [('removed', 'a'), ('changed', 'b'), ('added', 'd')]
+        )
+        self.assertEqual(changes[1]['fields'], {'price': [Decimal('1'), Decimal('2')]})
+        self.assertEqual(changes[2]['product'], {'name': 'd', 'price': Decimal('1'), 'stock': 1, 'category': 'x'})
+        self.assertEqual(str(result), "1 added, 1 removed, 1 changed, 1 unchanged")
+
+    def test_changes_that_kept_the_row_hash_are_found(self):
+        import_products([{'name': name, 'price': '1', 'stock': 1, 'category': 'x'} for name in ('b', 'a', 'B')])
+        old = list(iter_products_by_name('default'))
+        self.assertEqual([row.name for row in old], ['B', 'a', 'b'])
+        # Bulk updates do not recompute the hashes
+        Product.objects.filter(name='a').update(price=5)
+        changes, result = self.diff({'old': old, 'new': list(iter_products_by_name('default'))})
+        self.assertEqual(changes, [{'change': 'changed', 'name': 'a', 'fields': {'price': [Decimal(1), Decimal(5)]}}])
+        self.assertEqual(str(result), "0 added, 0 removed, 1 changed, 2 unchanged")
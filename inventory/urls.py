@@ -1,14 +1,29 @@
-from django.urls import path
+from django.conf import settings
+from django.urls import path, re_path
 import inventory.views as views
+import inventory.async_views as async_views
+
+# Views over all database versions, served concurrently under ASGI
+fanout_views = async_views if settings.ASYNC_VIEWS else views
 
 
 urlpatterns = [
-    path('', views.list_all_products, name='list_all_products'),
-    path('workflow-tasks', views.list_all_tasks, name='list_all_tasks'),
+    path('', fanout_views.list_all_products, name='list_all_products'),
+    path('search/', fanout_views.search_all_products, name='search_all_products'),
+    path('workflow-tasks', fanout_views.list_all_tasks, name='list_all_tasks'),
     path("workflow-progress/<str:db_alias>/", views.workflow_progress, name="workflow_progress"),
-    path("workflow-progress/", views.workflow_progress_all, name="workflow_progress_all"),
-    path('overall-progress/', views.overall_progress, name='overall_progress'),    
+    path("workflow-progress/", fanout_views.workflow_progress_all, name="workflow_progress_all"),
+    path('overall-progress/', fanout_views.overall_progress, name='overall_progress'),    
+    path('progress-updates/', fanout_views.progress_updates, name='progress_updates'),
     path('trigger-workflows/', views.trigger_workflows, name='trigger_workflows'),
+    path('workflow-batch/<str:batch_id>/', views.workflow_batch, name='workflow_batch'),
     path('task-progress/<str:db>/<int:pk>/', views.task_progress, name='task_progress'),
+    path('task-progress/', views.tasks_progress, name='tasks_progress'),
     path('terminate-all-tasks/', views.terminate_and_cleanup, name='terminate_all_tasks'),    
+    path('delete-all-tasks/', views.delete_and_cleanup, name='delete_all_tasks'),
+    re_path(
+        r'^export/(?P<db_alias>[^/]+?)\.(?P<fmt>csv|jsonl)(?P<compressed>\.gz)?$', 
+        views.download_products, name='download_products'
+    ),
+    path('diff/<str:old>/<str:new>.jsonl', views.diff_versions, name='diff_versions'),
 ]
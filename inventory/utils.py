@@ -1,21 +1,549 @@
 # inventory/utils.py
+import io
+import os
+import csv
+import gzip
+import json
+import zlib
+import shutil
+import hashlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from decimal import ROUND_HALF_UP, Decimal
+from itertools import islice
 from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist
-from inventory.models import Product, Task
+from django.db import connections, transaction
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db.models import Case, Count, FloatField, Max, Min, Q, Sum, Value, When
+from django.db.models.functions import Cast
+from inventory.models import ROW_HASH_SEPARATOR, ImportedFile, Product, Task, product_row_hash
+from inventory.stamps import bump_generation
 
 
-def import_products(data, version=None):
+# Bounds of the values accepted by the Product price and stock columns
+REQUIRED_COLUMNS = ('name', 'price', 'stock')
+PRICE_FIELD = Product._meta.get_field('price')
+PRICE_QUANTUM = Decimal(1).scaleb(-PRICE_FIELD.decimal_places)
+PRICE_LIMIT = Decimal(10) ** (PRICE_FIELD.max_digits - PRICE_FIELD.decimal_places)
+STOCK_LIMIT = 2 ** 31
+
+EXPORT_FIELDS = ('name', 'price', 'stock', 'category')
+
+
+class ImportResult:
+    
+    def __init__(self, inserted=0, updated=0, unchanged=0, rejected=0):
+        self.inserted = inserted
+        self.updated = updated
+        self.unchanged = unchanged
+        self.rejected = rejected
+    
+    @property
+    def total(self):
+        return self.inserted + self.updated + self.unchanged
+    
+    def merge(self, other):
+        self.inserted += other.inserted
+        self.updated += other.updated
+        self.unchanged += other.unchanged
+        self.rejected += other.rejected
+        return self
+    
+    def __str__(self):
+        return f"{self.inserted} inserted, {self.updated} updated, {self.unchanged} unchanged, {self.rejected} rejected"
+
+
+class RejectedRows:
+    """
+    Counts the rows rejected by validation and writes them, with the reason, to an optional CSV file.
+    A resumed import passes the `offset` (see `tell`) its file had at the checkpoint it resumes from.
+    """
+    
+    def __init__(self, path=None, offset=0):
+        self.path = path
+        self.offset = offset
+        self.count = 0
+        self._file = None
+        self._writer = None
+    
+    def __enter__(self):
+        if self.path and os.path.exists(self.path):
+            if self.offset:
+                # The rows after the checkpoint are read, and rejected, again
+                os.truncate(self.path, self.offset)
+            else:
+                # Rejections of a previous import are stale
+                os.remove(self.path)
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+    
+    def __call__(self, row_number, row, reason):
+        self.count += 1
+        if not self.path:
+            return
+        columns = [column for column in row.keys() if column is not None]
+        if self._writer is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            is_new = not os.path.exists(self.path)
+            self._file = open(self.path, 'a', newline='', encoding='utf-8')
+            self._writer = csv.writer(self._file)
+            if is_new:
+                self._writer.writerow(['row', 'reason'] + columns)
+        self._writer.writerow([row_number, reason] + [row[column] for column in columns])
+
+    def tell(self):
+        """Size of the file written so far."""
+        if self._file:
+            self._file.flush()
+        return os.path.getsize(self.path) if self.path and os.path.exists(self.path) else 0
+    
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file, self._writer = None, None
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def build_product(product_data):
+    price = PRICE_FIELD.to_python(product_data.get('price', 0))
+    product = Product(
+        name=product_data.get('name'),
+        price=price.quantize(PRICE_QUANTUM, rounding=ROUND_HALF_UP),
+        stock=int(product_data.get('stock', 0)),
+        category=product_data.get('category', 'Unknown')
+    )
+    product.row_hash = product_row_hash(product)
+    return product
+
+
+def upsert_products(batch, database_alias):
+    # Last row wins for duplicate names, as with update_or_create
+    products = {}
+    for product_data in batch:
+        product = build_product(product_data)
+        products[product.name] = product
+    
+    # Only the row hashes are compared, so unchanged rows are never loaded or written
+    existing = Product.objects.using(database_alias).filter(name__in=list(products.keys()))
+    existing = {name: (pk, row_hash) for name, pk, row_hash in existing.values_list('name', 'pk', 'row_hash')}
+    
+    result = ImportResult()
+    to_create, to_update = [], []
+    for name, product in products.items():
+        current = existing.get(name)
+        if current is None:
+            to_create.append(product)
+        elif current[1] != product.row_hash:
+            product.pk = current[0]
+            to_update.append(product)
+        else:
+            result.unchanged += 1
+    
+    if to_create:
+        Product.objects.using(database_alias).bulk_create(to_create)
+    if to_update:
+        Product.objects.using(database_alias).bulk_update(to_update, ['price', 'stock', 'category', 'row_hash'])
+    result.inserted += len(to_create)
+    result.updated += len(to_update)
+    return result
+
+
+def import_products(data, version=None, batch_size=None):
+    database_alias = version if version else "default"
+    batch_size = batch_size if batch_size else settings.IMPORT_BATCH_SIZE
+    result = ImportResult()
+    
+    # One SELECT plus at most one INSERT and one UPDATE per batch, all in one transaction
+    with transaction.atomic(using=database_alias):
+        for batch in batched(data, batch_size):
+            result.merge(upsert_products(batch, database_alias))
+        if result.inserted or result.updated:
+            bump_generation(database_alias)
+    return result
+
+
+def delete_products(version=None):
+    """
+    Delete the products of a database version in one statement and bump its generation once. QuerySet.delete()
+    would fetch and delete them one by one, as products send delete signals.
+    """
+    database_alias = version if version else "default"
+    with transaction.atomic(using=database_alias):
+        count = Product.objects.using(database_alias).all()._raw_delete(database_alias)
+        bump_generation(database_alias)
+    return count
+
+
+def parse_price(value):
+    price = Decimal(value).quantize(PRICE_QUANTUM, rounding=ROUND_HALF_UP)
+    if not price.is_finite() or abs(price) >= PRICE_LIMIT:
+        raise ValueError(value)
+    return price
+
+
+def parse_stock(value):
+    stock = int(value)
+    if not -STOCK_LIMIT <= stock < STOCK_LIMIT:
+        raise ValueError(value)
+    return stock
+
+
+def parse_column(values, parse, column):
+    """Parse a whole column at once, and only look for the failing values when that fails."""
+    try:
+        return list(map(parse, values)), {}
+    except (TypeError, ValueError, ArithmeticError):
+        pass
+    parsed, errors = [], {}
+    for i, value in enumerate(values):
+        try:
+            parsed.append(parse(value))
+        except (TypeError, ValueError, ArithmeticError):
+            parsed.append(None)
+            errors[i] = f"Invalid {column} {value!r}"
+    return parsed, errors
+
+
+def validate_products(rows, first_row=1):
+    """
+    Validate and coerce a chunk of CSV rows column by column. Prices are parsed as exact decimals.
+    Returns the product dicts of the valid rows, and (row number, row, reason) for the rejected rows.
+    """
+    names = [row['name'] for row in rows]
+    prices, price_errors = parse_column([row['price'] for row in rows], parse_price, 'price')
+    stocks, stock_errors = parse_column([row['stock'] for row in rows], parse_stock, 'stock')
+    # Handle missing category gracefully
+    categories = [row.get('category') if row.get('category') is not None else 'Unknown' for row in rows]
+    
+    products, rejected = [], []
+    for i, product in enumerate(zip(names, prices, stocks, categories)):
+        reason = price_errors.get(i) or stock_errors.get(i) or (None if product[0] else "Missing name")
+        if reason:
+            rejected.append((first_row + i, rows[i], reason))
+        else:
+            products.append(dict(zip(('name', 'price', 'stock', 'category'), product)))
+    return products, rejected
+
+
+def read_products_csv(file_path, chunk_size=None, start=0, stop=None, on_reject=None):
+    """
+    Yield the valid products of a CSV file (or of its rows `start` to `stop`) in lists of at most
+    `chunk_size` rows. Invalid rows are passed to `on_reject(row_number, row, reason)` and skipped.
+    """
+    chunk_size = chunk_size if chunk_size else settings.IMPORT_CHUNK_SIZE
+    with open(file_path, newline='', encoding='utf-8') as csvfile:
+        reader = csv.DictReader(csvfile)
+        for column in REQUIRED_COLUMNS:
+            if column not in (reader.fieldnames or []):
+                raise KeyError(column)
+        # Skip to the first row of the range without building dicts for the skipped rows (blank lines are
+        # not rows, as for DictReader and count_csv_rows)
+        deque(islice((row for row in reader.reader if row), start), maxlen=0)
+        
+        row_number = start + 1
+        for chunk in batched(islice(reader, stop - start if stop is not None else None), chunk_size):
+            products, rejected = validate_products(chunk, first_row=row_number)
+            row_number += len(chunk)
+            if on_reject:
+                for rejected_row in rejected:
+                    on_reject(*rejected_row)
+            yield products
+
+
+def count_csv_rows(file_path):
+    # The rows read by read_products_csv: the header is the first line, blank lines are skipped
+    with open(file_path, newline='', encoding='utf-8') as csvfile:
+        reader = csv.reader(csvfile)
+        if next(reader, None) is None:
+            return 0
+        return sum(1 for row in reader if row)
+
+
+def plan_import_shards(csv_files, shards):
+    """
+    Split the rows of the CSV files into (at most) `shards` contiguous row ranges of equal size.
+    Each shard is a list of [file_path, start, stop] segments, as a shard may span several files.
+    """
+    files = [(file_path, count_csv_rows(file_path)) for file_path in csv_files]
+    total = sum(rows for _, rows in files)
+    shard_size = -(-total // shards) if total else 0
+    plan, shard, shard_rows = [], [], 0
+    
+    for file_path, rows in files:
+        start = 0
+        while start < rows:
+            stop = min(rows, start + shard_size - shard_rows)
+            shard.append([file_path, start, stop])
+            shard_rows += stop - start
+            start = stop
+            if shard_rows == shard_size:
+                plan.append(shard)
+                shard, shard_rows = [], 0
+    if shard:
+        plan.append(shard)
+    return plan
+
+
+def skip_segments(segments, rows):
+    """Returns the [file_path, start, stop] segments of a shard without their first `rows` rows."""
+    remaining = []
+    for file_path, start, stop in segments:
+        skipped = min(rows, stop - start)
+        rows -= skipped
+        if start + skipped < stop:
+            remaining.append([file_path, start + skipped, stop])
+    return remaining
+
+
+def import_products_stream(chunks, version=None, batch_size=None):
+    """
+    Import chunks of products as they are produced. Each chunk is written in its own
+    transaction by a writer thread while the next chunk is parsed, so at most two
+    chunks are held in memory at any time.
+    """
+    database_alias = version if version else "default"
+    result = ImportResult()
+    
+    with ThreadPoolExecutor(max_workers=1) as writer:
+        pending = None
+        try:
+            for chunk in chunks:
+                if pending:
+                    result.merge(pending.result())
+                pending = writer.submit(import_products, chunk, database_alias, batch_size)
+            if pending:
+                result.merge(pending.result())
+        finally:
+            # Release the connections opened by the writer thread
+            writer.submit(connections.close_all).result()
+    return result
+
+
+def import_products_copy(file_path, version=None, batch_size=None, chunk_size=None, on_reject=None):
+    """
+    Import a CSV file through PostgreSQL COPY into a temporary staging table and merge it into the
+    product table with a single INSERT ... ON CONFLICT statement. The rows are validated as by the
+    other engines, so a file gives the same products and rejections whatever the engine. Other
+    database engines fall back to the batched ORM path.
+    """
     database_alias = version if version else "default"
+    connection = connections[database_alias]
+    rejected = RejectedRows()
+    
+    def reject(*rejected_row):
+        rejected(*rejected_row)
+        if on_reject:
+            on_reject(*rejected_row)
+    
+    chunks = read_products_csv(file_path, chunk_size=chunk_size, on_reject=reject)
+    if connection.vendor != 'postgresql':
+        rows = (product for chunk in chunks for product in chunk)
+        result = import_products(rows, version=database_alias, batch_size=batch_size)
+        result.rejected = rejected.count
+        return result
+    
+    table = connection.ops.quote_name(Product._meta.db_table)
+    with transaction.atomic(using=database_alias), connection.cursor() as cursor:
+        # Temporary tables are not WAL-logged and are dropped with the transaction. The staging columns
+        # do not depend on the file, the rows are numbered in the order they are copied.
+        cursor.execute("""
+            CREATE TEMPORARY TABLE product_staging (
+                staging_row bigserial, name text, price numeric(10, 2), stock integer, category text
+            ) ON COMMIT DROP
+        """)
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for chunk in chunks:
+            if not chunk:
+                continue
+            writer.writerows([product[field] for field in EXPORT_FIELDS] for product in chunk)
+            buffer.seek(0)
+            # Empty fields are empty strings, not NULL, as with the ORM
+            cursor.copy_expert(
+                "COPY product_staging (name, price, stock, category) FROM STDIN "
+                "WITH (FORMAT csv, FORCE_NOT_NULL (name, category))",
+                buffer
+            )
+            buffer.seek(0)
+            buffer.truncate()
+        # Last row wins for duplicate names, as with the ORM path
+        cursor.execute(f"""
+            WITH products AS (
+                SELECT DISTINCT ON (name) name, price, stock, category
+                FROM product_staging
+                ORDER BY name, staging_row DESC
+            ), upserted AS (
+                INSERT INTO {table} (name, price, stock, category, row_hash)
+                SELECT name, price, stock, category,
+                    md5(concat_ws(%(separator)s, name, price::text, stock::text, category))
+                FROM products
+                ON CONFLICT (name) DO UPDATE
+                SET price = EXCLUDED.price, stock = EXCLUDED.stock, category = EXCLUDED.category,
+                    row_hash = EXCLUDED.row_hash
+                WHERE {table}.row_hash IS DISTINCT FROM EXCLUDED.row_hash
+                RETURNING (xmax = 0) AS inserted
+            )
+            SELECT
+                (SELECT COUNT(*) FROM products),
+                COUNT(*) FILTER (WHERE inserted),
+                COUNT(*) FILTER (WHERE NOT inserted)
+            FROM upserted
+        """, {'separator': ROW_HASH_SEPARATOR})
+        staged, inserted, updated = cursor.fetchone()
+        if inserted or updated:
+            bump_generation(database_alias)
+    return ImportResult(
+        inserted=inserted, updated=updated, unchanged=staged - inserted - updated, rejected=rejected.count
+    )
+
+
+def file_content_hash(file_path, block_size=1024 * 1024):
+    content_hash = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            content_hash.update(block)
+    return content_hash.hexdigest()
+
+
+def check_import_manifest(file_path, database_alias):
+    """
+    Compare a CSV file with its entry in the import manifest of the database alias.
+    Returns whether the file is unchanged since its last import, and its current fingerprint.
+    The contents are only hashed when the size or modification time differ.
+    """
+    stat = os.stat(file_path)
+    fingerprint = {'size': stat.st_size, 'mtime': stat.st_mtime, 'content_hash': None}
+    entry = ImportedFile.objects.using(database_alias).filter(name=os.path.basename(file_path)).first()
+    if entry and entry.size == stat.st_size and entry.mtime == stat.st_mtime:
+        return True, fingerprint
+    
+    fingerprint['content_hash'] = file_content_hash(file_path)
+    if entry and entry.content_hash == fingerprint['content_hash']:
+        # Touched but not modified, remember the new modification time
+        entry.mtime = stat.st_mtime
+        entry.save(using=database_alias, update_fields=['mtime'])
+        return True, fingerprint
+    return False, fingerprint
+
+
+def update_import_manifest(file_path, database_alias, fingerprint, rows=0):
+    if not fingerprint.get('content_hash'):
+        fingerprint = dict(fingerprint, content_hash=file_content_hash(file_path))
+    ImportedFile.objects.using(database_alias).update_or_create(
+        name=os.path.basename(file_path),
+        defaults=dict(fingerprint, rows=rows)
+    )
+
+
+def get_export_path(db_alias, fmt=None, part=None):
+    """Path of the gzip export of a database version, or of one of its parts."""
+    fmt = fmt if fmt else settings.EXPORT_FORMAT
+    name = f"products.part{part}.{fmt}.gz" if part else f"products.{fmt}.gz"
+    return os.path.join(settings.EXPORT_PATH, db_alias, name)
+
+
+def get_export_range(db_alias, shard, shards):
+    """Primary-key range [start, stop) of the products exported by shard `shard` of `shards`."""
+    bounds = Product.objects.using(db_alias).aggregate(first=Min('pk'), last=Max('pk'))
+    if bounds['first'] is None:
+        return 0, 0
+    width = -(-(bounds['last'] - bounds['first'] + 1) // shards)
+    start = bounds['first'] + (shard - 1) * width
+    return start, start + width
+
+
+def iter_products_export(db_alias, fmt=None, pk_range=None, header=True, chunk_size=None):
+    """
+    Yield the products of a database version (or of a primary-key range) as (rows, text) blocks
+    of CSV or JSON Lines. Rows are fetched through a server-side cursor, so memory use does not
+    depend on the number of products.
+    """
+    fmt = fmt if fmt else settings.EXPORT_FORMAT
+    chunk_size = chunk_size if chunk_size else settings.EXPORT_CHUNK_SIZE
+    products = Product.objects.using(db_alias).order_by('pk')
+    if pk_range:
+        products = products.filter(pk__gte=pk_range[0], pk__lt=pk_range[1])
+    
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if fmt == 'csv' else None
+    if writer and header:
+        writer.writerow(EXPORT_FIELDS)
+    rows = 0
+    for row in products.values_list(*EXPORT_FIELDS).iterator(chunk_size=chunk_size):
+        if writer:
+            writer.writerow(row)
+        else:
+            buffer.write(json.dumps(dict(zip(EXPORT_FIELDS, row)), default=str) + "\n")
+        rows += 1
+        if rows == chunk_size:
+            yield rows, buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            rows = 0
+    if buffer.tell():
+        yield rows, buffer.getvalue()
+
+
+def gzip_stream(blocks):
+    """Compress text blocks into one gzip stream as they are produced."""
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    for block in blocks:
+        data = compressor.compress(block.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_products(db_alias, file_path, fmt=None, pk_range=None, header=True, chunk_size=None, on_progress=None):
+    """
+    Stream the products of a database version (or of a primary-key range) into a gzip CSV or
+    JSON Lines file, which is replaced atomically once complete.
+    """
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    tmp_path = f"{file_path}.tmp"
+    count = 0
+    with gzip.open(tmp_path, 'wt', newline='', encoding='utf-8') as f:
+        for rows, text in iter_products_export(db_alias, fmt, pk_range, header=header, chunk_size=chunk_size):
+            f.write(text)
+            count += rows
+            if on_progress and rows:
+                on_progress(count)
+    os.replace(tmp_path, file_path)
+    return count
+
+
+def assemble_export(db_alias, fmt=None, parts=None):
+    """
+    Concatenate the export parts of a database version into its export file. Gzip members can be
+    concatenated as-is, and only the first CSV part has a header, so no data is decompressed.
+    """
+    parts = parts if parts else settings.EXPORT_SHARDS
+    part_paths = [get_export_path(db_alias, fmt, part) for part in range(1, parts + 1)]
+    missing = [os.path.basename(part_path) for part_path in part_paths if not os.path.exists(part_path)]
+    if missing:
+        # A partial export must not replace the complete one
+        raise FileNotFoundError(f"Missing export parts of {db_alias}: {', '.join(missing)}")
     
-    for product_data in data:
-        Product.objects.using(database_alias).update_or_create(
-            name=product_data.get('name'),
-            defaults={
-                'price': product_data.get('price', 0),
-                'stock': product_data.get('stock', 0),
-                'category': product_data.get('category', 'Unknown')  # Include category if provided                
-            }
-        )
+    file_path = get_export_path(db_alias, fmt)
+    with open(f"{file_path}.tmp", 'wb') as f:
+        for part_path in part_paths:
+            with open(part_path, 'rb') as part:
+                shutil.copyfileobj(part, f)
+    os.replace(f"{file_path}.tmp", file_path)
+    for part_path in part_paths:
+        os.remove(part_path)
+    return file_path
 
 
 def get_products(version="default"):
@@ -29,6 +557,51 @@ def get_products(version="default"):
     return Product.objects.using(database_alias).all()
 
 
+def get_products_page(version, after=None, before=None, size=None):
+    """
+    Keyset page of the products of a database version, ordered by id. Only the listed columns
+    are fetched, and the page costs one index range scan whatever its position in the catalog.
+    Returns the products, and the cursors of the next and previous pages (None at either end).
+    """
+    size = size if size else settings.PRODUCTS_PAGE_SIZE
+    products = Product.objects.using(version).values('id', *EXPORT_FIELDS)
+    if before is not None:
+        rows = list(products.filter(id__lt=before).order_by('-id')[:size + 1])
+        has_more = len(rows) > size
+        rows = rows[:size][::-1]
+        previous_cursor = rows[0]['id'] if has_more else None
+        next_cursor = rows[-1]['id'] if rows else None
+    else:
+        if after is not None:
+            products = products.filter(id__gt=after)
+        rows = list(products.order_by('id')[:size + 1])
+        has_more = len(rows) > size
+        rows = rows[:size]
+        next_cursor = rows[-1]['id'] if has_more else None
+        previous_cursor = rows[0]['id'] if after is not None and rows else None
+    return {'products': rows, 'next': next_cursor, 'previous': previous_cursor}
+
+
+def search_products(version, query, limit):
+    """
+    The `limit` products of a database version best matching `query` by name or category, best first.
+    On PostgreSQL the matches use the trigram indexes and similar names are found too; elsewhere only
+    exact, prefix and substring matches are ranked.
+    """
+    matches = Q(name__icontains=query) | Q(category__icontains=query)
+    rank = Case(
+        When(name__iexact=query, then=Value(1.0)),
+        When(name__istartswith=query, then=Value(0.5)),
+        default=Value(0.0),
+        output_field=FloatField()
+    )
+    if connections[version].vendor == 'postgresql':
+        matches |= Q(name__trigram_similar=query)
+        rank = rank + TrigramSimilarity('name', query)
+    products = Product.objects.using(version).filter(matches).annotate(rank=rank)
+    return list(products.order_by('-rank', 'name').values('id', *EXPORT_FIELDS, 'rank')[:limit])
+
+
 class WorkflowProgress:
     
     def __init__(self):
@@ -68,4 +641,35 @@ class WorkflowProgress:
             else:
                 self.status[task.status] = 1
         self.percent = 100 * self.current / self.total if self.total else 0
+
+    def update_totals(self, totals):
+        for row in totals:
+            self.total += row['count']
+            self.current += row['current'] or 0
+            self.status[row['status']] = self.status.get(row['status'], 0) + row['count']
+        self.percent = 100 * self.current / self.total if self.total else 0
+
+    def merge(self, other):
+        self.total += other.total
+        self.current += other.current
+        for status, count in other.status.items():
+            self.status[status] = self.status.get(status, 0) + count
+        self.percent = 100 * self.current / self.total if self.total else 0
+
+    def update_from_db(self, db_alias):
+        # Same as update() over all tasks of the database, summed by the database
+        self.update_totals(get_task_totals(db_alias))
+
+
+def get_task_totals(db_alias):
+    """Returns the number of tasks and the sum of their completed fraction per status."""
+    fraction = Case(
+        When(total__gt=0, then=Cast('current', FloatField()) / Cast('total', FloatField())),
+        default=Value(0.0),
+        output_field=FloatField()
+    )
+    return list(
+        Task.objects.using(db_alias).order_by().values('status')
+        .annotate(count=Count('pk'), current=Sum(fraction))
+    )
                 
\ No newline at end of file
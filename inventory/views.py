@@ -1,51 +1,269 @@
+import os
 import json
+import asyncio
+import hashlib
+from concurrent import futures
+from functools import wraps
+from asgiref.sync import sync_to_async
 from django.views.decorators.cache import never_cache
+from django.views.decorators.http import condition
 from django.shortcuts import render, redirect
+from django.urls import reverse
+from celery.result import AsyncResult, GroupResult
+from celery_progress.backend import Progress
 from celery_progress.views import get_progress
-from inventory.models import Product, Task
-from inventory.utils import WorkflowProgress
-from django.http import HttpResponse, JsonResponse
+from django_celery_results.models import TaskResult
+from inventory import catalog
+from inventory.diff import diff_products
+from inventory.models import Task
+from inventory.progress import get_task_state, get_task_states, load_snapshot, read_task_states, save_snapshot
+from inventory.stamps import PRODUCTS, TASKS, get_generation, get_generation_stamp, get_stamp_validators
+from inventory.utils import (
+    WorkflowProgress, get_export_path, gzip_stream, iter_products_export
+)
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.conf import settings
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from django.db import connections
 from django.db.models import Q
 from django.core.management import call_command
-from .tasks import run_all_workflows
+from .tasks import start_all_workflows
 
 
 def get_active_databases():
     return [alias for alias in settings.DATABASES.keys() if alias != 'default']
 
 
+# Threads of the database fan-out. A query outliving its timeout keeps its thread until the database stops
+# it, so they are bounded rather than started per request
+executor = futures.ThreadPoolExecutor(max_workers=settings.ASYNC_DB_THREADS, thread_name_prefix='fanout')
+
+
+def query_database(func, db_alias, *args, timeout=None):
+    # Runs in a worker thread, whose connection to the database is closed afterwards
+    connection = connections[db_alias]
+    try:
+        if timeout and connection.vendor == 'postgresql':
+            # Have the database give up on the queries when the view does
+            with connection.cursor() as cursor:
+                cursor.execute("SET statement_timeout = %s", [int(timeout * 1000)])
+        return func(db_alias, *args)
+    finally:
+        connection.close()
+
+
+def map_databases(func, databases, *args, timeout=None):
+    """
+    Call `func(db_alias, *args)` for every database concurrently, each in a thread of `executor`. Returns the
+    result per database, or the exception raised (a TimeoutError when the database did not answer within
+    `timeout` seconds), as gather_databases does for the async views.
+    """
+    timeout = timeout if timeout is not None else settings.ASYNC_DB_TIMEOUT
+    queries = {
+        db_alias: executor.submit(query_database, func, db_alias, *args, timeout=timeout) for db_alias in databases
+    }
+    futures.wait(queries.values(), timeout=timeout)
+    results = {}
+    for db_alias, query in queries.items():
+        if not query.done():
+            query.cancel()
+            results[db_alias] = futures.TimeoutError()
+        else:
+            results[db_alias] = query.exception() or query.result()
+    return results
+
+
+def get_error(result):
+    if isinstance(result, (asyncio.TimeoutError, futures.TimeoutError)):
+        return "timed out"
+    return str(result)
+
+
+def stamped(scope):
+    """
+    Answers 304 Not Modified while the change stamps of `scope` (TASKS or PRODUCTS) did not change in the
+    databases shown by the view: the one of its db_alias argument, or all of them. Works on async views too.
+    """
+    def get_validators(request, kwargs):
+        databases = [kwargs['db_alias']] if 'db_alias' in kwargs else get_active_databases()
+        return get_stamp_validators(scope, databases, request.get_full_path())
+
+    def get_response(request, etag, last_modified):
+        if etag is None:
+            return None
+        return get_conditional_response(request, etag=etag, last_modified=last_modified)
+
+    def set_headers(response, etag, last_modified):
+        if etag is not None and response.status_code == 200:
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+            # Let browsers keep the response, but ask again each time
+            patch_cache_control(response, no_cache=True)
+        return response
+
+    def decorator(view):
+        if asyncio.iscoroutinefunction(view):
+            @wraps(view)
+            async def wrapped_view(request, *args, **kwargs):
+                etag, last_modified = await sync_to_async(get_validators, thread_sensitive=False)(request, kwargs)
+                response = get_response(request, etag, last_modified)
+                if response is None:
+                    response = set_headers(await view(request, *args, **kwargs), etag, last_modified)
+                return response
+        else:
+            @wraps(view)
+            def wrapped_view(request, *args, **kwargs):
+                etag, last_modified = get_validators(request, kwargs)
+                response = get_response(request, etag, last_modified)
+                if response is None:
+                    response = set_headers(view(request, *args, **kwargs), etag, last_modified)
+                return response
+        return wrapped_view
+    return decorator
+
+
+def get_int_param(request, name, default=None):
+    try:
+        return int(request.GET[name])
+    except (KeyError, ValueError):
+        return default
+
+
+def get_page_url(request, db_alias, cursor_name, cursor):
+    # Move the cursor of one version only, and keep the pages of the others
+    if cursor is None:
+        return None
+    params = request.GET.copy()
+    params.pop(f"after_{db_alias}", None)
+    params.pop(f"before_{db_alias}", None)
+    params[f"{cursor_name}_{db_alias}"] = cursor
+    return f"?{params.urlencode()}"
+
+
+def get_products_listing(request, db_alias, size):
+    page = catalog.get_page(
+        db_alias, size=size,
+        after=get_int_param(request, f"after_{db_alias}"),
+        before=get_int_param(request, f"before_{db_alias}"),
+    )
+    return {
+        'count': catalog.count_products(db_alias),
+        'products': page['products'],
+        'next_url': get_page_url(request, db_alias, 'after', page['next']),
+        'previous_url': get_page_url(request, db_alias, 'before', page['previous']),
+    }
+
+
+def get_page_size(request):
+    size = get_int_param(request, 'size', settings.PRODUCTS_PAGE_SIZE)
+    return max(min(size, settings.PRODUCTS_PAGE_SIZE_MAX), 1)
+
+
+def get_tasks(db_alias):
+    return list(Task.objects.using(db_alias).all().order_by("triggered_on"))
+
+
+def get_workflow_progress(db_alias):
+    # Read the progress cache first, the database only when the cache is unavailable
+    progress = WorkflowProgress()
+    states = get_task_states(db_alias)
+    if states is None:
+        progress.update_from_db(db_alias)
+    else:
+        progress.update(tasks=states)
+    return progress
+
+
+def get_workflow(db_alias, tasks):
+    progress = WorkflowProgress()
+    progress.update(tasks=tasks)
+    return {
+        "tasks": tasks,
+        "progress_percent": round(progress.percent, 2),
+        "is_complete": progress.is_complete,
+        "is_active": progress.is_active,
+    }
+
+
+@stamped(PRODUCTS)
 def list_all_products(request):
     databases = get_active_databases()
     all_products = {}
+    size = get_page_size(request)
 
     for db_alias in databases:
         try:
-            all_products[db_alias] = Product.objects.using(db_alias).all()
+            all_products[db_alias] = get_products_listing(request, db_alias, size)
         except Exception as e:
-            all_products[db_alias] = f"Error fetching products: {e}"
+            all_products[db_alias] = {'error': f"Error fetching products: {e}"}
 
     return render(request, 'inventory/products/list.html', {'all_products': all_products})
 
 
+def get_search_params(request):
+    # The query, the page, and how many results of each version are needed to build that page
+    query = request.GET.get('q', '').strip()
+    size = settings.SEARCH_PAGE_SIZE
+    page = max(get_int_param(request, 'page', 1), 1)
+    page = min(page, -(-settings.SEARCH_MAX_RESULTS // size))
+    return query, page, size, page * size + 1
+
+
+def get_search_context(request, query, page, size, results):
+    """Merges the best results of every version into one ranked page."""
+    products, errors = [], {}
+    for db_alias, result in results.items():
+        if isinstance(result, Exception):
+            errors[db_alias] = get_error(result)
+            continue
+        products.extend(dict(product, version=db_alias) for product in result)
+    products.sort(key=lambda product: (-product['rank'], product['name'], product['version']))
+
+    start = (page - 1) * size
+    params = request.GET.copy()
+    params['page'] = page + 1
+    next_url = f"?{params.urlencode()}" if len(products) > start + size else None
+    params['page'] = page - 1
+    previous_url = f"?{params.urlencode()}" if page > 1 else None
+    return {
+        'query': query,
+        'products': products[start:start + size],
+        'errors': errors,
+        'next_url': next_url,
+        'previous_url': previous_url,
+    }
+
+
+@stamped(PRODUCTS)
+def search_all_products(request):
+    query, page, size, limit = get_search_params(request)
+    results = {}
+    if query:
+        results = map_databases(catalog.search, get_active_databases(), query, limit)
+
+    context = get_search_context(request, query, page, size, results)
+    return render(request, 'inventory/products/search.html', context)
+
+
+@stamped(TASKS)
 def list_all_tasks(request):
     databases = get_active_databases()
     all_tasks = {}
 
     for db_alias in databases:
         try:
-            all_tasks[db_alias] = Task.objects.using(db_alias).all()
+            all_tasks[db_alias] = get_tasks(db_alias)
         except Exception as e:
             all_tasks[db_alias] = f"Error fetching tasks: {e}"
 
     return render(request, 'inventory/workflow/tasks.html', {'all_tasks': all_tasks})
 
 
+@stamped(TASKS)
 def workflow_progress(request, db_alias):
     try:
-        progress = WorkflowProgress()
-        tasks = Task.objects.using(db_alias).all()
-        progress.update(tasks=tasks)
+        progress = get_workflow_progress(db_alias)
         return JsonResponse({
             'progress_percent': round(progress.percent, 2),
             "is_complete": progress.is_complete,
@@ -59,47 +277,112 @@ def workflow_progress_all(request):
     workflows = {}
     databases = get_active_databases()
     
-    # Group tasks by database alias
+    # Group tasks by database alias, unreachable databases are shown without tasks
     for db_alias in databases:
-        progress = WorkflowProgress()
-        tasks = Task.objects.using(db_alias).all().order_by("triggered_on")
-        progress.update(tasks=tasks)
-        
-        print(f"\nWorkflow: {db_alias}")
-        for db_task in tasks:
-            print(f"- Task: {db_task}")
-            
-        workflows[db_alias] = {
-            "tasks": tasks,
-            "progress_percent": round(progress.percent, 2),
-            "is_complete": progress.is_complete,
-            "is_active": progress.is_active,
-        }
+        try:
+            tasks = get_tasks(db_alias)
+        except Exception:
+            tasks = []
+        workflows[db_alias] = get_workflow(db_alias, tasks)
 
     return render(request, "inventory/workflow/progress.html", {"workflows": workflows})
 
 
+@stamped(TASKS)
 def overall_progress(request):
     databases = get_active_databases()
     progress = WorkflowProgress()
+    unavailable = []
 
     for db_alias in databases:
         try:
-            tasks = Task.objects.using(db_alias).all()
-            progress.update(tasks=tasks)
+            progress.merge(get_workflow_progress(db_alias))
         except Exception:
-            pass
+            unavailable.append(db_alias)
 
     return JsonResponse({
         "progress": round(progress.percent, 2),
         "is_complete": progress.is_complete,
         "is_active": progress.is_active,
+        "unavailable": unavailable,
     })
 
 
+EXPORT_CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+
+
+def export_etag(request, db_alias, fmt, compressed=None):
+    if db_alias not in get_active_databases():
+        return None
+    return hashlib.md5(f"{db_alias}:{fmt}:{compressed}:{get_generation(db_alias)}".encode()).hexdigest()
+
+
+@condition(etag_func=export_etag)
+def download_products(request, db_alias, fmt, compressed=None):
+    if db_alias not in get_active_databases():
+        raise Http404(f"Database '{db_alias}' does not exist.")
+
+    filename = f"products-{db_alias}.{fmt}{compressed or ''}"
+    file_path = get_export_path(db_alias, fmt)
+    # The precomputed file is used until the products change again
+    _, changed = get_generation_stamp(db_alias)
+    is_exported = compressed and os.path.exists(file_path) and os.path.getmtime(file_path) >= changed
+
+    if is_exported and settings.EXPORT_ACCEL_REDIRECT_URL:
+        # Let nginx send the precomputed file
+        response = HttpResponse(content_type='application/gzip')
+        response['X-Accel-Redirect'] = f"{settings.EXPORT_ACCEL_REDIRECT_URL}{db_alias}/{os.path.basename(file_path)}"
+    elif is_exported:
+        response = FileResponse(open(file_path, 'rb'), content_type='application/gzip')
+    else:
+        blocks = (text for _, text in iter_products_export(db_alias, fmt))
+        if compressed:
+            response = StreamingHttpResponse(gzip_stream(blocks), content_type='application/gzip')
+        else:
+            response = StreamingHttpResponse(blocks, content_type=EXPORT_CONTENT_TYPES[fmt])
+        # Pass the stream through nginx as it is produced
+        response['X-Accel-Buffering'] = 'no'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def diff_versions(request, old, new):
+    for db_alias in (old, new):
+        if db_alias not in get_active_databases():
+            raise Http404(f"Database '{db_alias}' does not exist.")
+
+    lines = (json.dumps(change, default=str) + "\n" for change in diff_products(old, new))
+    response = StreamingHttpResponse(lines, content_type=EXPORT_CONTENT_TYPES['jsonl'])
+    response['X-Accel-Buffering'] = 'no'
+    response['Content-Disposition'] = f'inline; filename="diff-{old}-{new}.jsonl"'
+    return response
+
+
 def trigger_workflows(request):
-    run_all_workflows()
-    return redirect('workflow_progress_all')
+    # The workflows are set up by the workers, the progress page follows the batch until they are
+    batch = start_all_workflows()
+    return redirect(f"{reverse('workflow_progress_all')}?batch={batch.id}")
+
+
+@never_cache
+def workflow_batch(request, batch_id):
+    batch = GroupResult.restore(batch_id)
+    if batch is None:
+        return JsonResponse({'error': f"Batch '{batch_id}' not found"}, status=404)
+    return JsonResponse({
+        'id': batch.id,
+        'total': len(batch.results),
+        'completed': batch.completed_count(),
+        'ready': batch.ready(),
+        'failed': batch.failed(),
+        'results': [
+            {'id': result.id, 'state': result.state, 'result': str(result.result) if result.ready() else None}
+            for result in batch.results
+        ],
+    })
 
 
 def get_task_progress_pending():
@@ -129,30 +412,216 @@ def get_task_progress_revoked():
     }
 
 
+def get_task_progress_failure():
+    return {
+        'state': "FAILURE",
+        'complete': True,
+        'success': False,
+        'progress': {'pending': False, 'current': 100, 'total': 100, 'percent': 100}
+    }
+
+
+def get_task_progress_state(state):
+    if state.status == Task.Status.RUNNING:
+        task = Task(type=state.type, current=state.current, total=state.total)
+        return {
+            'state': "PROGRESS",
+            'complete': False,
+            'success': None,
+            'progress': {
+                'pending': False,
+                'current': state.current,
+                'total': state.total,
+                'percent': round(100 * task.percent, 2),
+                'description': task.progress_detail
+            }
+        }
+    elif state.status == Task.Status.PENDING:
+        return get_task_progress_pending()
+    elif state.status == Task.Status.COMPLETED:
+        return get_task_progress_success()
+    elif state.status == Task.Status.FAILED:
+        return get_task_progress_failure()
+    return get_task_progress_revoked()
+
+
+def get_task_progress_status(task):
+    # Progress of a task that was never sent to Celery
+    if task.status == Task.Status.PENDING:
+        return get_task_progress_pending()
+    elif task.status == Task.Status.COMPLETED:
+        return get_task_progress_success()
+    return get_task_progress_revoked()
+
+
+def get_task_progress_result(task_result):
+    # Same as celery_progress for a result stored by the django-db backend (None when not stored yet)
+    if task_result is None or task_result.status in ('PENDING', 'STARTED'):
+        return get_task_progress_pending()
+    if task_result.status == 'REVOKED':
+        return get_task_progress_revoked()
+    result = json.loads(task_result.result) if task_result.result else None
+    if task_result.status == 'PROGRESS':
+        return {'state': task_result.status, 'complete': False, 'success': None, 'progress': result}
+    ctx = get_task_progress_success() if task_result.status == 'SUCCESS' else get_task_progress_failure()
+    ctx.update({'state': task_result.status, 'result': result if task_result.status == 'SUCCESS' else str(result)})
+    return ctx
+
+
 @never_cache
 def task_progress(request, db, pk):
+    state = get_task_state(db, pk)
+    if state is not None:
+        return HttpResponse(json.dumps(get_task_progress_state(state)), content_type='application/json')
     try:
         task = Task.objects.using(db).get(pk=pk)
-        if task.task_id:
+        # Stopped tasks are revoked, not failed as celery_progress reports them
+        if task.task_id and task.status != Task.Status.REVOKED:
             return get_progress(request, task_id=task.task_id)
         else:
-            if task.status == Task.Status.PENDING:
-                ctx = get_task_progress_pending()
-            elif task.status == Task.Status.COMPLETED:
-                ctx = get_task_progress_success()
-            else:
-                ctx = get_task_progress_revoked()
+            ctx = get_task_progress_status(task)
     except Task.DoesNotExist:
         ctx = get_task_progress_revoked()
     return HttpResponse(json.dumps(ctx), content_type='application/json')
 
 
+def parse_task_keys(values):
+    # "<db_alias>:<pk>" pairs, grouped by database
+    task_keys = {}
+    for value in values:
+        db_alias, _, pk = value.rpartition(':')
+        if db_alias in get_active_databases() and pk.isdigit():
+            task_keys.setdefault(db_alias, set()).add(int(pk))
+    return task_keys
+
+
+@never_cache
+def tasks_progress(request):
+    """
+    Progress of many tasks at once, keyed by "<db_alias>-<pk>": the tasks given as ?task=<db_alias>:<pk>
+    (repeated), the active ones with ?active=1, or all of them. The databases that could not be read are
+    listed as unavailable.
+    """
+    if request.GET.getlist('task'):
+        task_keys = parse_task_keys(request.GET.getlist('task'))
+        queries = {db_alias: Task.objects.using(db_alias).filter(pk__in=pks) for db_alias, pks in task_keys.items()}
+    else:
+        queries = {db_alias: Task.objects.using(db_alias).all() for db_alias in get_active_databases()}
+        if get_int_param(request, 'active'):
+            active = [Task.Status.PENDING, Task.Status.RUNNING]
+            queries = {db_alias: tasks.filter(status__in=active) for db_alias, tasks in queries.items()}
+
+    tasks, unavailable = {}, []
+    for db_alias, query in queries.items():
+        try:
+            for task in query.only('pk', 'task_id', 'status'):
+                tasks[f"{db_alias}-{task.pk}"] = task
+        except Exception:
+            unavailable.append(db_alias)
+
+    # One lookup in the result backend for all tasks sent to Celery
+    task_ids = [task.task_id for task in tasks.values() if task.task_id]
+    if settings.CELERY_RESULT_BACKEND == 'django-db':
+        results = TaskResult.objects.filter(task_id__in=task_ids).only('task_id', 'status', 'result')
+        results = {task_result.task_id: task_result for task_result in results}
+
+    ctx = {}
+    for key, task in tasks.items():
+        if not task.task_id or task.status == Task.Status.REVOKED:
+            ctx[key] = get_task_progress_status(task)
+        elif settings.CELERY_RESULT_BACKEND == 'django-db':
+            ctx[key] = get_task_progress_result(results.get(task.task_id))
+        else:
+            ctx[key] = Progress(AsyncResult(task.task_id)).get_info()
+    return JsonResponse({'tasks': ctx, 'unavailable': unavailable})
+
+
+def get_progress_snapshot():
+    """Returns the progress of every workflow and task, keyed like the progress bars of the pages."""
+    snapshot = {'workflows': {}, 'tasks': {}}
+    overall = WorkflowProgress()
+    for db_alias in get_active_databases():
+        try:
+            states = get_task_states(db_alias)
+            if states is None:
+                states = read_task_states(db_alias)
+        except Exception:
+            # Its tasks are kept by the clients until it answers again
+            snapshot['workflows'][db_alias] = {'unavailable': True}
+            continue
+        progress = WorkflowProgress()
+        progress.update(tasks=states)
+        overall.merge(progress)
+        snapshot['workflows'][db_alias] = {
+            'progress_percent': round(progress.percent, 2),
+            "is_complete": progress.is_complete,
+            "is_active": progress.is_active,
+        }
+        for state in states:
+            snapshot['tasks'][f"{db_alias}-{state.pk}"] = get_task_progress_state(state)
+    snapshot['overall'] = {
+        "progress": round(overall.percent, 2),
+        "is_complete": overall.is_complete,
+        "is_active": overall.is_active,
+    }
+    return snapshot
+
+
+def get_progress_update(since=None):
+    """
+    Returns the token of the current progress, and what changed since the progress of the `since` token
+    (everything if that one is unknown), or None when nothing changed. The token is the tasks stamp of the
+    databases when available, so that no progress is read while it does not change.
+    """
+    stamp, _ = get_stamp_validators(TASKS, get_active_databases())
+    stamp = stamp.strip('"') if stamp else None
+    if stamp and stamp == since:
+        return since, None
+    snapshot = get_progress_snapshot()
+    unavailable = {db_alias for db_alias, workflow in snapshot['workflows'].items() if workflow.get('unavailable')}
+    if stamp and not unavailable:
+        token = stamp
+    else:
+        token = hashlib.md5(json.dumps(snapshot, sort_keys=True).encode()).hexdigest()
+    if token == since:
+        return token, None
+    save_snapshot(token, snapshot)
+    previous = load_snapshot(since) if since else None
+    update = {'since': token, 'full': previous is None, 'overall': snapshot['overall'], 'removed': {}}
+    for section in ('workflows', 'tasks'):
+        old = previous[section] if previous else {}
+        update[section] = {key: value for key, value in snapshot[section].items() if old.get(key) != value}
+        update['removed'][section] = [
+            key for key in old if key not in snapshot[section] and key.rpartition('-')[0] not in unavailable
+        ]
+    return token, update
+
+
+@never_cache
+def progress_updates(request):
+    # Answers at once (the client waits between requests), the ASGI view holds the request instead
+    token, update = get_progress_update(request.GET.get('since'))
+    update = update or {'since': token}
+    update['wait'] = int(settings.PROGRESS_POLL_INTERVAL * 1000)
+    return JsonResponse(update)
+
+
 def terminate_and_cleanup(request):
     try:
         # Call the custom management command with arguments
-        call_command('db_tasks', '--purge', 'all', '--delete', 'all')
+        # The tasks are kept (revoked) with their checkpoints, so that the workflows can resume
+        call_command('db_tasks', '--purge', 'all', '--revoke')
         # Redirect to homepage or another page
         return redirect('/')
     except Exception as e:
         # Handle any errors
+        return HttpResponse(f"Error running command: {str(e)}", status=500)
+
+
+def delete_and_cleanup(request):
+    try:
+        # The tasks are stopped first, the workflows start over when started again
+        call_command('db_tasks', '--purge', 'all', '--revoke', '--delete', 'all')
+        return redirect('/')
+    except Exception as e:
         return HttpResponse(f"Error running command: {str(e)}", status=500)
\ No newline at end of file
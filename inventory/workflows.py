@@ -3,32 +3,33 @@ from inventory.models import Task
 
 
 class WorkflowTask:
-    def __init__(self, task:Task, func):
-        self.task = task 
-        self.func = func 
+    def __init__(self, task:Task, func, after=()):
+        self.task = task
+        self.func = func
+        self.after = set(after)
 
 
 class WorkflowStep:
     def __init__(self, name="", parallel=False):
-        self.name = name 
+        self.name = name
         self.parallel = parallel
         self.tasks = []
-    
+
     @property
     def progress_total(self):
-        return sum([task.total for task in self.tasks]) 
-    
+        return sum([task.total for task in self.tasks])
+
     @property
     def progress_current(self):
-        return sum([task.current for task in self.tasks]) 
-    
+        return sum([task.current for task in self.tasks])
+
     @property
     def progress_percent(self):
         return self.progress_current / self.progress_total
 
     def add_task(self, task: Task, func):
         self.tasks.append(WorkflowTask(task=task, func=func))
-    
+
     def execute(self):
         if len(self.tasks) == 0:
             return None
@@ -38,43 +39,127 @@ class WorkflowStep:
         if self.parallel:
             return group(task.func for task in self.tasks)
         # Sequential execution
-        task_chain = chain(self.tasks[0].func) 
+        task_chain = chain(self.tasks[0].func)
         for task in self.tasks[1:]:
             task_chain = task_chain | task.func
         return task_chain
 
 
-class Workflow:
+class DagWorkflow:
+    """
+    Tasks with explicit dependencies, run with as much parallelism as the dependencies allow.
+    Tasks are keyed by the name of their database task, and may only depend on tasks added before
+    them (so the graph has no cycles). Dependencies only order the tasks: use immutable signatures
+    (`.si()`), as the results of the tasks are not passed on. Tasks without a signature are already
+    done, and only order the ones depending on them.
+    """
     def __init__(self, db_alias):
         self.db_alias = db_alias
-        self.steps = []
+        self.tasks = {}
 
     @property
     def progress_current(self):
-        return sum([step.progress_current for step in self.steps])
-    
+        return sum([node.task.current for node in self.tasks.values()])
+
     @property
     def progress_total(self):
-        return sum([step.progress_total for step in self.steps])
-    
+        return sum([node.task.total for node in self.tasks.values()])
+
     @property
     def progress_percent(self):
         return self.progress_current / self.progress_total
 
-    def add_step(self, step):
-        self.steps.append(step)
+    def add_task(self, task: Task, func, after=()):
+        unknown = [key for key in after if key not in self.tasks]
+        if unknown:
+            raise ValueError(f"Task '{task.name}' depends on unknown tasks: {', '.join(unknown)}")
+        if task.name in self.tasks:
+            raise ValueError(f"Task '{task.name}' is already in the workflow")
+        self.tasks[task.name] = WorkflowTask(task=task, func=func, after=after)
+        return task.name
+
+    def get_ancestors(self):
+        # Insertion order is a topological order
+        ancestors = {}
+        for key, node in self.tasks.items():
+            ancestors[key] = set(node.after).union(*(ancestors[parent] for parent in node.after))
+        return ancestors
+
+    def critical_path(self, weight=None):
+        """
+        Returns the keys of the longest chain of dependent tasks left to run, and its length. Tasks weigh
+        their remaining iterations by default (at least 1), tasks already done nothing.
+        """
+        weight = weight if weight else (
+            lambda node: 0 if node.func is None else max(node.task.total - node.task.checkpoint, 1)
+        )
+        length, previous = {}, {}
+        for key, node in self.tasks.items():
+            parent = max(node.after, key=lambda parent: length[parent], default=None)
+            previous[key] = parent
+            length[key] = weight(node) + (length[parent] if parent else 0)
+        key = max(length, key=length.get, default=None)
+        path = []
+        while key:
+            path.append(key)
+            key = previous[key]
+        length = length[path[0]] if path else 0
+        return [key for key in path[::-1] if self.tasks[key].func is not None], length
+
+    def get_components(self, keys, ancestors):
+        # Groups of tasks with no dependency between groups
+        components = []
+        for key in keys:
+            related = [c for c in components if any(k in ancestors[key] or key in ancestors[k] for k in c)]
+            merged = [k for c in related for k in c] + [key]
+            components = [c for c in components if c not in related] + [merged]
+        return [sorted(c, key=list(keys).index) for c in components]
+
+    def split_series(self, keys, ancestors):
+        """
+        Splits connected tasks into a head and a tail to run one after the other. The split is exact
+        when every tail task depends on every head task; graphs that are not series-parallel have no
+        such split and wait for their first tasks as a whole (losing some parallelism).
+        """
+        for i in range(1, len(keys)):
+            head = set(keys[:i])
+            if all(head <= ancestors[key] for key in keys[i:]):
+                return keys[:i], keys[i:]
+        head = [key for key in keys if not (ancestors[key] & set(keys))]
+        return head, [key for key in keys if key not in head]
+
+    def compile(self, keys=None, ancestors=None):
+        """Returns the Celery canvas (nested chains, groups and chords) running the tasks."""
+        ancestors = ancestors if ancestors is not None else self.get_ancestors()
+        keys = list(keys if keys is not None else (key for key, node in self.tasks.items() if node.func is not None))
+        if not keys:
+            return None
+        if len(keys) == 1:
+            return self.tasks[keys[0]].func
+        components = self.get_components(keys, ancestors)
+        if len(components) > 1:
+            return group([self.compile(component, ancestors) for component in components])
+        head, tail = self.split_series(keys, ancestors)
+        return chain(self.compile(head, ancestors), self.compile(tail, ancestors))
 
     def run(self):
-        workflow_chain = None
-
-        for step in self.steps:
-            step_execution = step.execute()
-            if not step_execution:
-                continue
-            if workflow_chain is None:
-                workflow_chain = step_execution
-            else:
-                workflow_chain = workflow_chain | step_execution
-
-        if workflow_chain:
-            workflow_chain.apply_async()    
+        canvas = self.compile()
+        if canvas:
+            canvas.apply_async()
+
+
+class Workflow(DagWorkflow):
+    """Steps run one after the other, the tasks of each step in parallel or in sequence."""
+    def __init__(self, db_alias):
+        super().__init__(db_alias)
+        self.steps = []
+        self.last = []
+
+    def add_step(self, step):
+        self.steps.append(step)
+        for workflow_task in step.tasks:
+            key = self.add_task(workflow_task.task, workflow_task.func, after=self.last)
+            if not step.parallel:
+                self.last = [key]
+        if step.parallel and step.tasks:
+            self.last = [workflow_task.task.name for workflow_task in step.tasks]
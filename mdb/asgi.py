@@ -9,8 +9,25 @@ https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
 
 import os
 
+from asgiref.sync import ThreadSensitiveContext
+from asgiref.wsgi import WsgiToAsgi
 from django.core.asgi import get_asgi_application
+from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mdb.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Django 3.2 iterates streamed responses on the event loop, where the database cannot be queried. The
+# exports and diffs (see inventory/urls.py) are served as WSGI instead, streamed from a thread
+streaming_application = WsgiToAsgi(get_wsgi_application())
+STREAMING_PATHS = ('/export/', '/diff/')
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'http' and scope['path'].startswith(STREAMING_PATHS):
+        # Its own thread, so that a long stream does not hold up the sync views
+        async with ThreadSensitiveContext():
+            await streaming_application(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
@@ -24,6 +24,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     # 3rd-party
     'django_celery_results',
     'celery_progress',    
@@ -76,9 +77,39 @@ else:
     
 IMPORT_DIR = 'import'
 EXPORT_DIR = 'export'
+REJECTED_DIR = 'rejected'
 
 IMPORT_PATH = os.path.join(MEDIA_ROOT, IMPORT_DIR)
 EXPORT_PATH = os.path.join(MEDIA_ROOT, EXPORT_DIR)
+# Rows rejected by import validation, per database version and file
+REJECTED_PATH = os.path.join(MEDIA_ROOT, REJECTED_DIR)
+
+# Number of products written per bulk statement during imports
+IMPORT_BATCH_SIZE = int(os.getenv('IMPORT_BATCH_SIZE', default=1000))
+# Number of CSV rows parsed and held in memory at once by streaming imports
+IMPORT_CHUNK_SIZE = int(os.getenv('IMPORT_CHUNK_SIZE', default=10000))
+# Number of parallel import tasks (row-range shards) created by the import workflow
+IMPORT_SHARDS = int(os.getenv('IMPORT_SHARDS', default=3))
+# Number of parallel export tasks (primary-key ranges) and the format of the exported files
+EXPORT_SHARDS = int(os.getenv('EXPORT_SHARDS', default=3))
+EXPORT_FORMAT = os.getenv('EXPORT_FORMAT', default='csv')  # 'csv' or 'jsonl'
+# Number of products fetched per round trip by exports
+EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', default=5000))
+# Number of products listed per database version and page (can be lowered or raised up to the max with ?size=)
+PRODUCTS_PAGE_SIZE = int(os.getenv('PRODUCTS_PAGE_SIZE', default=50))
+PRODUCTS_PAGE_SIZE_MAX = int(os.getenv('PRODUCTS_PAGE_SIZE_MAX', default=500))
+# Number of search results per page, and how deep the results of all versions can be paged
+SEARCH_PAGE_SIZE = int(os.getenv('SEARCH_PAGE_SIZE', default=25))
+SEARCH_MAX_RESULTS = int(os.getenv('SEARCH_MAX_RESULTS', default=500))
+# Internal nginx location serving EXPORT_PATH (see nginx.conf), files are served by Django when empty
+EXPORT_ACCEL_REDIRECT_URL = os.getenv('EXPORT_ACCEL_REDIRECT_URL', default='' if DEBUG else '/protected-export/')
+# 'wsgi' or 'asgi' (see gunicorn.conf.py), the async views query the database versions concurrently
+SERVER_MODE = os.getenv('SERVER_MODE', default='wsgi')
+ASYNC_VIEWS = int(os.getenv('ASYNC_VIEWS', default=int(SERVER_MODE == 'asgi')))
+# Seconds to wait for each database version before a view over all of them shows it as unavailable
+ASYNC_DB_TIMEOUT = float(os.getenv('ASYNC_DB_TIMEOUT', default=5))
+# Threads querying the database versions for the views over all of them, per process
+ASYNC_DB_THREADS = int(os.getenv('ASYNC_DB_THREADS', default=16))
 
 
 # Password validation
@@ -123,6 +154,55 @@ CELERY_BROKER_URL = os.getenv("CELERY_BROKER", "redis://redis:6379/0")
 CELERY_RESULT_BACKEND = os.getenv("CELERY_BACKEND", "django-db")
 CELERY_TIMEZONE = os.getenv('TIME_ZONE','Europe/Athens')
 
+# Milliseconds, or percent of progress, after which the progress of a running task is written again
+PROGRESS_SAVE_INTERVAL_MS = int(os.getenv('PROGRESS_SAVE_INTERVAL_MS', default=1000))
+PROGRESS_SAVE_PERCENT = float(os.getenv('PROGRESS_SAVE_PERCENT', default=1))
+# Seconds without any task of a workflow saving its progress after which its pending or running tasks are
+# considered left by a dead worker, and the workflow can be started again (resuming from the checkpoints of
+# its tasks). Keep it above the longest a task goes without reporting progress
+WORKFLOW_STALE_AFTER = int(os.getenv('WORKFLOW_STALE_AFTER', default=600))
+# Redis hash per database version holding the progress of its tasks (disabled when empty)
+PROGRESS_REDIS_URL = os.getenv('PROGRESS_REDIS_URL', default='')
+PROGRESS_REDIS_PREFIX = os.getenv('PROGRESS_REDIS_PREFIX', default='mdb:progress')
+PROGRESS_REDIS_TIMEOUT = float(os.getenv('PROGRESS_REDIS_TIMEOUT', default=0.5))
+# Seconds the progress of a database version is kept after its last task update
+PROGRESS_CACHE_TTL = int(os.getenv('PROGRESS_CACHE_TTL', default=600))
+# Redis hash of the change stamps of the tasks and products per database version (ETag/Last-Modified)
+STAMPS_REDIS_KEY = os.getenv('STAMPS_REDIS_KEY', default='mdb:stamps')
+# Seconds between two progress checks: by the browsers under WSGI (a request each time), by the held
+# requests under ASGI. And the longest an ASGI progress request waits for a change
+PROGRESS_POLL_INTERVAL = float(os.getenv('PROGRESS_POLL_INTERVAL', default=1 if SERVER_MODE == 'asgi' else 2))
+PROGRESS_LONG_POLL_TIMEOUT = int(os.getenv('PROGRESS_LONG_POLL_TIMEOUT', default=25))
+
+
+# Cache
+# Product listings, counts and searches per database version, keyed by its products generation
+# (the products stamp, or a row of the database version when the stamps are unavailable).
+# Local memory (per process, least recently used entries are culled) unless a Redis URL is given,
+# in which case Redis evicts by its maxmemory-policy (e.g. allkeys-lru)
+CATALOG_CACHE_URL = os.getenv('CATALOG_CACHE_URL', default='')
+CATALOG_CACHE_TTL = int(os.getenv('CATALOG_CACHE_TTL', default=3600))
+CATALOG_CACHE_MAX_ENTRIES = int(os.getenv('CATALOG_CACHE_MAX_ENTRIES', default=10000))
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'catalog': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'catalog',
+        'TIMEOUT': CATALOG_CACHE_TTL,
+        'OPTIONS': {'MAX_ENTRIES': CATALOG_CACHE_MAX_ENTRIES},
+    },
+}
+if CATALOG_CACHE_URL:
+    CACHES['catalog'] = {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': CATALOG_CACHE_URL,
+        'TIMEOUT': CATALOG_CACHE_TTL,
+        'KEY_PREFIX': 'mdb:catalog',
+    }
+
 
 # Database
 # Get the active database versions from the environment (if any)